@@ -0,0 +1,142 @@
+# app/chatbot/batching.py
+from __future__ import annotations
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import Future
+from typing import Any, Callable, Deque, Dict, List
+
+# Decoding settings a request can pick; only requests with the same preset share a batch
+DECODING_PRESETS: Dict[str, Dict[str, Any]] = {
+    "greedy": {"max_new_tokens": 160, "num_beams": 1, "do_sample": False},
+    "beam": {"max_new_tokens": 160, "num_beams": 4, "early_stopping": True},
+}
+
+
+class _Request:
+    __slots__ = ("prompt", "preset", "future", "enqueued")
+
+    def __init__(self, prompt: str, preset: str) -> None:
+        self.prompt = prompt
+        self.preset = preset
+        self.future: Future = Future()
+        self.enqueued = time.monotonic()
+
+
+class BatchingNaturalizer:
+    """
+    Groups concurrent prompts into batched calls of a text2text-generation pipeline.
+
+    submit() queues a prompt and returns a Future. One scheduler thread takes the oldest
+    prompt, waits until max_batch_size prompts with the same preset are queued or the
+    oldest has waited max_wait_ms, runs one pipeline call for the group and resolves
+    every Future with its own generated text (or the exception of the call).
+    """
+
+    def __init__(
+        self,
+        pipe: Callable[..., Any],
+        max_batch_size: int = 8,
+        max_wait_ms: float = 20,
+        presets: Dict[str, Dict[str, Any]] | None = None,
+    ) -> None:
+        self.pipe = pipe
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.presets = presets or DECODING_PRESETS
+        self._pending: Deque[_Request] = deque()
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._batch_sizes: Counter = Counter()
+        self._max_queue_depth = 0
+        self._total_wait = 0.0
+        self._thread = threading.Thread(target=self._run, name="naturalizer-batcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, prompt: str, preset: str = "beam") -> Future:
+        if preset not in self.presets:
+            raise ValueError(f"Unknown decoding preset: {preset}")
+        request = _Request(prompt, preset)
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Naturalizer batcher is stopped")
+            self._pending.append(request)
+            self._max_queue_depth = max(self._max_queue_depth, len(self._pending))
+            self._cond.notify()
+        return request.future
+
+    def generate(self, prompt: str, preset: str = "beam", timeout: float | None = None) -> str:
+        return self.submit(prompt, preset).result(timeout=timeout)
+
+    def stop(self) -> None:
+        """Stops the scheduler once the queued prompts are generated."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify()
+        self._thread.join()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            batches = sum(self._batch_sizes.values())
+            requests = sum(size * count for size, count in self._batch_sizes.items())
+            return {
+                "queue_depth": len(self._pending),
+                "max_queue_depth": self._max_queue_depth,
+                "batches": batches,
+                "requests": requests,
+                "mean_batch_size": requests / batches if batches else 0.0,
+                "batch_sizes": dict(sorted(self._batch_sizes.items())),
+                "mean_queue_wait_ms": 1000 * self._total_wait / requests if requests else 0.0,
+            }
+
+    def _next_batch(self) -> List[_Request] | None:
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            oldest = self._pending[0]
+            deadline = oldest.enqueued + self.max_wait
+            while not self._stopped:
+                same_preset = sum(1 for r in self._pending if r.preset == oldest.preset)
+                remaining = deadline - time.monotonic()
+                if same_preset >= self.max_batch_size or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            batch, rest = [], deque()
+            for request in self._pending:
+                if request.preset == oldest.preset and len(batch) < self.max_batch_size:
+                    batch.append(request)
+                else:
+                    rest.append(request)
+            self._pending = rest
+
+            now = time.monotonic()
+            self._batch_sizes[len(batch)] += 1
+            self._total_wait += sum(now - r.enqueued for r in batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            # callers that gave up (cancelled) are not generated for
+            batch = [r for r in batch if r.future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+            try:
+                outputs = self.pipe(
+                    [r.prompt for r in batch], batch_size=len(batch), **self.presets[batch[0].preset]
+                )
+            except Exception as exc:
+                for request in batch:
+                    request.future.set_exception(exc)
+                continue
+            for request, output in zip(batch, outputs):
+                # a pipeline returns one list of candidates per prompt, or the dict itself
+                if isinstance(output, list):
+                    output = output[0]
+                request.future.set_result(output["generated_text"].strip())
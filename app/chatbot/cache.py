@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.logger import setup_logger
+
+logger = setup_logger("chatbot.cache")
+
+
+class ResponseCache:
+    """
+    Thread-safe LRU cache with a per-entry time to live.
+    Keeps hit, miss, eviction and expiration counters for tuning its size and ttl.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 3600.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), least recently used first
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Returns the cached value for key, or None when it is missing or expired."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+        logger.info("Response cache cleared")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+class SemanticCache:
+    """
+    Thread-safe cache keyed by meaning: a lookup returns the value stored for the most
+    similar earlier query, if their cosine similarity reaches `threshold`.
+
+    Query vectors come from `embed` and are kept in one (max_size x dim) matrix, so a
+    lookup is a single matrix-vector product. Entries expire after `ttl` seconds and the
+    least recently used entry is evicted when the cache is full. Every entry is tagged
+    with the intent (knowledge base answer) it was generated from, so all answers built
+    on one intent can be dropped when it changes.
+    """
+
+    def __init__(self, embed, threshold: float = 0.9, max_size: int = 512, ttl: float = 3600.0):
+        self.embed_fn = embed
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._vectors = None  # allocated on the first set, once the dimension is known
+        self._live = np.zeros(max_size, dtype=bool)
+        self._slots = OrderedDict()  # slot -> (expires_at, intent, value), least recently used first
+        self._intent_slots = {}  # intent -> set of slots
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def embed(self, query: str):
+        """L2-normalized query vector, or None when the query has nothing to embed."""
+        vector = np.asarray(self.embed_fn(query), dtype=np.float32).ravel()
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else None
+
+    def _drop(self, slot):
+        _, intent, _ = self._slots.pop(slot)
+        self._live[slot] = False
+        slots = self._intent_slots.get(intent)
+        if slots is not None:
+            slots.discard(slot)
+            if not slots:
+                del self._intent_slots[intent]
+
+    def _best_slot(self, vector):
+        """(slot, similarity) of the closest live entry, (None, 0) when there is none."""
+        if self._vectors is None or vector is None or len(vector) != self._vectors.shape[1] or not self._slots:
+            return None, 0.0
+        scores = np.where(self._live, self._vectors @ vector, -np.inf)
+        slot = int(np.argmax(scores))
+        return (slot, float(scores[slot])) if self._live[slot] else (None, 0.0)
+
+    def get(self, vector):
+        """Value of the closest cached query to the embedded query, or None below the threshold."""
+        with self._lock:
+            slot, similarity = self._best_slot(vector)
+            if slot is None or similarity < self.threshold:
+                self.misses += 1
+                return None
+            expires_at, _, value = self._slots[slot]
+            if expires_at <= time.monotonic():
+                self._drop(slot)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._slots.move_to_end(slot)
+            self.hits += 1
+            logger.info(f"Semantic cache hit with similarity {similarity:.3f}")
+            return value
+
+    def set(self, vector, value, intent=None):
+        if vector is None:
+            return
+        with self._lock:
+            if self._vectors is None or len(vector) != self._vectors.shape[1]:
+                # a new embedding space (e.g. a reloaded vocabulary) makes old vectors meaningless
+                self._vectors = np.zeros((self.max_size, len(vector)), dtype=np.float32)
+                self._live[:] = False
+                self._slots.clear()
+                self._intent_slots.clear()
+
+            slot, similarity = self._best_slot(vector)
+            if slot is not None and similarity >= 0.999:
+                # the same query again: replace its entry
+                self._drop(slot)
+            elif len(self._slots) >= self.max_size:
+                slot = next(iter(self._slots))
+                self._drop(slot)
+                self.evictions += 1
+            else:
+                slot = int(np.argmin(self._live))
+
+            self._vectors[slot] = vector
+            self._live[slot] = True
+            self._slots[slot] = (time.monotonic() + self.ttl, intent, value)
+            self._intent_slots.setdefault(intent, set()).add(slot)
+
+    def intents(self) -> set:
+        with self._lock:
+            return set(self._intent_slots)
+
+    def invalidate_intent(self, intent) -> int:
+        """Drops every entry generated from `intent` and returns how many were dropped."""
+        with self._lock:
+            slots = list(self._intent_slots.get(intent, ()))
+            for slot in slots:
+                self._drop(slot)
+            self.invalidations += len(slots)
+        return len(slots)
+
+    def clear(self):
+        with self._lock:
+            self._live[:] = False
+            self._slots.clear()
+            self._intent_slots.clear()
+        logger.info("Semantic cache cleared")
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._slots),
+                "max_size": self.max_size,
+                "threshold": self.threshold,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
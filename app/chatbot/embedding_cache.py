@@ -0,0 +1,166 @@
+# app/chatbot/embedding_cache.py
+from __future__ import annotations
+import fcntl
+import hashlib
+import json
+import re
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+EMBEDDING_CACHE_DIR = HERE / "models" / "embedding_cache"
+
+DIGEST_SIZE = 16
+
+
+def text_digest(text: str) -> bytes:
+    return hashlib.sha256(text.encode("utf-8")).digest()[:DIGEST_SIZE]
+
+
+class EmbeddingCache:
+    """
+    Persistent embedding cache for one embedder, filled by index builds and read by
+    query-time encoding, shared by every worker process.
+
+    Files in <root>/<embedder name>/:
+      keys.bin     DIGEST_SIZE byte text hashes, one per row, append-only
+      vectors.f16  float16 row-major matrix, memory-mapped for reads
+      meta.json    {"embedder": name, "dim": dimension}
+
+    Appends are serialized across processes with an flock on keys.bin. Query-time
+    encodes (encode(..., persist=False)) never append: their new embeddings are kept in a
+    per-process LRU of max_query_entries rows.
+    """
+
+    def __init__(
+        self,
+        embedder_name: str,
+        root: Path = EMBEDDING_CACHE_DIR,
+        max_entries: int = 200_000,
+        max_query_entries: int = 1024,
+    ):
+        self.embedder_name = embedder_name
+        self.dir = Path(root) / re.sub(r"[^\w.-]+", "__", embedder_name)
+        self.max_entries = max_entries
+        self.max_query_entries = max_query_entries
+        self._keys_path = self.dir / "keys.bin"
+        self._vectors_path = self.dir / "vectors.f16"
+        self._meta_path = self.dir / "meta.json"
+        self._lock = threading.Lock()
+        self._rows: Dict[bytes, int] = {}
+        self._dim: int | None = None
+        self._vectors: np.ndarray | None = None
+        # digest -> float32 vector of query-time encodes, least recently used first
+        self._query_vectors: OrderedDict[bytes, np.ndarray] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        with self._lock:
+            self._refresh()
+
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def _refresh(self) -> None:
+        """(Re)reads the rows written so far, including those appended by other processes."""
+        if not self._meta_path.exists():
+            return
+        self._dim = json.loads(self._meta_path.read_text(encoding="utf-8"))["dim"]
+        keys = self._keys_path.read_bytes() if self._keys_path.exists() else b""
+        vector_rows = self._vectors_path.stat().st_size // (2 * self._dim) if self._vectors_path.exists() else 0
+        # a crash between the two appends can leave one file longer than the other
+        num_rows = min(len(keys) // DIGEST_SIZE, vector_rows)
+        for row in range(len(self._rows), num_rows):
+            self._rows.setdefault(keys[row * DIGEST_SIZE:(row + 1) * DIGEST_SIZE], row)
+        self._vectors = (
+            np.memmap(self._vectors_path, dtype=np.float16, mode="r", shape=(num_rows, self._dim)) if num_rows else None
+        )
+
+    def _append(self, digests: List[bytes], vectors: np.ndarray) -> None:
+        self.dir.mkdir(parents=True, exist_ok=True)
+        with open(self._keys_path, "ab") as keys_file:
+            fcntl.flock(keys_file, fcntl.LOCK_EX)
+            try:
+                if not self._meta_path.exists():
+                    meta = {"embedder": self.embedder_name, "dim": int(vectors.shape[1])}
+                    self._meta_path.write_text(json.dumps(meta), encoding="utf-8")
+                self._refresh()
+                if vectors.shape[1] != self._dim:
+                    return
+                fresh, seen = [], set(self._rows)
+                for i, digest in enumerate(digests):
+                    if digest not in seen:
+                        seen.add(digest)
+                        fresh.append(i)
+                fresh = fresh[: max(0, self.max_entries - len(self._rows))]
+                if not fresh:
+                    return
+                # pad the vectors file to the key count first if a previous append was torn
+                with open(self._vectors_path, "ab") as vectors_file:
+                    vectors_file.truncate(len(self._rows) * 2 * self._dim)
+                    vectors_file.write(np.ascontiguousarray(vectors[fresh], dtype=np.float16).tobytes())
+                keys_file.truncate(len(self._rows) * DIGEST_SIZE)
+                keys_file.write(b"".join(digests[i] for i in fresh))
+                keys_file.flush()
+                self._refresh()
+            finally:
+                fcntl.flock(keys_file, fcntl.LOCK_UN)
+
+    def _remember(self, digests: List[bytes], vectors: np.ndarray) -> None:
+        for digest, vector in zip(digests, vectors):
+            self._query_vectors[digest] = vector.copy()
+            self._query_vectors.move_to_end(digest)
+        while len(self._query_vectors) > self.max_query_entries:
+            self._query_vectors.popitem(last=False)
+
+    def encode(
+        self, texts: List[str], load_embedder: Callable[[], object], persist: bool = True, **encode_kwargs
+    ) -> np.ndarray:
+        """
+        float32 embeddings of texts. Cached rows are read from disk; the embedder is only
+        loaded (via load_embedder) and run for texts that are not cached yet.
+        With persist=False, for user queries, new embeddings go to the in-memory LRU instead of
+        the files, so arbitrary messages neither fill the shared cache nor take its lock.
+        """
+        digests = [text_digest(text) for text in texts]
+        with self._lock:
+            rows = [self._rows.get(digest) for digest in digests]
+            vectors = self._vectors
+            dim = self._dim
+            remembered = {}
+            if not persist:
+                for i, row in enumerate(rows):
+                    if row is None and digests[i] in self._query_vectors:
+                        self._query_vectors.move_to_end(digests[i])
+                        remembered[i] = self._query_vectors[digests[i]]
+            missing = [i for i, row in enumerate(rows) if row is None and i not in remembered]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+
+        computed = None
+        if missing:
+            computed = np.asarray(
+                load_embedder().encode([texts[i] for i in missing], convert_to_numpy=True, **encode_kwargs),
+                dtype=np.float32,
+            )
+            dim = computed.shape[1]
+            with self._lock:
+                if persist:
+                    self._append([digests[i] for i in missing], computed)
+                else:
+                    self._remember([digests[i] for i in missing], computed)
+        elif remembered:
+            dim = len(next(iter(remembered.values())))
+
+        out = np.empty((len(texts), dim or 0), dtype=np.float32)
+        if computed is not None:
+            out[missing] = computed
+        for i, vector in remembered.items():
+            out[i] = vector
+        cached = [i for i, row in enumerate(rows) if row is not None]
+        if cached:
+            out[cached] = vectors[[rows[i] for i in cached]]
+        return out
@@ -0,0 +1,119 @@
+# app/chatbot/embedding_pipeline.py
+from __future__ import annotations
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Iterator, List, Tuple
+
+import numpy as np
+
+from app.chatbot.embedding_cache import EmbeddingCache
+
+# Worker processes encoding during a build (0 = encode in the building process)
+BUILD_WORKERS = int(os.getenv("RAG_BUILD_WORKERS", "0"))
+# Texts looked up, encoded and handed to the index per step; bounds build memory
+BUILD_CHUNK_SIZE = int(os.getenv("RAG_BUILD_CHUNK_SIZE", "1024"))
+# Texts per encode call inside a worker
+WORKER_BATCH_SIZE = int(os.getenv("RAG_BUILD_WORKER_BATCH_SIZE", "64"))
+
+_worker_model = None
+
+
+def _init_worker(embedder_name: str, threads: int) -> None:
+    global _worker_model
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    # the workers split the cores between them instead of each using all of them
+    torch.set_num_threads(threads)
+    _worker_model = SentenceTransformer(embedder_name)
+
+
+def _encode_part(texts: List[str]) -> np.ndarray:
+    return np.asarray(_worker_model.encode(texts, convert_to_numpy=True), dtype=np.float32)
+
+
+class PoolEmbedder:
+    """
+    SentenceTransformer-like encode() that spreads the texts over a pool of worker
+    processes, each holding its own copy of the model.
+    """
+
+    def __init__(self, embedder_name: str, workers: int, batch_size: int = WORKER_BATCH_SIZE):
+        self.batch_size = batch_size
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        # spawn: forking a process that already runs torch threads can deadlock
+        self._pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(embedder_name, threads),
+        )
+
+    def encode(self, texts: List[str], convert_to_numpy: bool = True, **_) -> np.ndarray:
+        parts = [texts[i:i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        return np.concatenate(list(self._pool.map(_encode_part, parts)))
+
+    def close(self) -> None:
+        self._pool.shutdown()
+
+
+class EmbeddingPipeline:
+    """
+    Streams the embeddings of an index build: texts are looked up in the embedding cache
+    and encoded chunk_size at a time, so only one chunk of vectors is held at once.
+    Misses go to a pool of `workers` processes (or the building process when 0), which
+    is only started on the first miss. Progress and throughput are logged per chunk.
+    """
+
+    def __init__(
+        self,
+        embedder_name: str,
+        workers: int = BUILD_WORKERS,
+        chunk_size: int = BUILD_CHUNK_SIZE,
+        log: Callable[[str], None] = print,
+    ):
+        self.embedder_name = embedder_name
+        self.workers = workers
+        self.chunk_size = max(1, chunk_size)
+        self.log = log
+        self.cache = EmbeddingCache(embedder_name)
+        self._embedder = None
+
+    def __enter__(self) -> "EmbeddingPipeline":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _load_embedder(self):
+        if self._embedder is None:
+            if self.workers > 0:
+                self._embedder = PoolEmbedder(self.embedder_name, self.workers)
+            else:
+                from sentence_transformers import SentenceTransformer
+
+                self._embedder = SentenceTransformer(self.embedder_name)
+        return self._embedder
+
+    def embed(self, texts: List[str], label: str = "texts") -> Iterator[Tuple[int, np.ndarray]]:
+        """Yields (offset of the chunk in texts, float32 embeddings of the chunk) in order."""
+        start_time = time.perf_counter()
+        hits, misses = self.cache.hits, self.cache.misses
+        for start in range(0, len(texts), self.chunk_size):
+            chunk = texts[start:start + self.chunk_size]
+            yield start, self.cache.encode(chunk, self._load_embedder)
+
+            done = start + len(chunk)
+            elapsed = time.perf_counter() - start_time
+            self.log(
+                f"  -> {label}: {done}/{len(texts)} "
+                f"({self.cache.misses - misses} encoded, {self.cache.hits - hits} cached, "
+                f"{done / elapsed if elapsed > 0 else 0:.0f}/s)"
+            )
+
+    def close(self) -> None:
+        if isinstance(self._embedder, PoolEmbedder):
+            self._embedder.close()
+        self._embedder = None
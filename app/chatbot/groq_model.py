@@ -1,30 +1,87 @@
 import os
+from typing import Iterator, Tuple
 from dotenv import load_dotenv
-from groq import Groq
 import markdown
 
+from app.chatbot.llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+from utils.logger import setup_logger
+
 load_dotenv()
 
-client = Groq(
-    api_key=os.environ.get("GROQ_API_KEY"),  # This is the default and can be omitted
+logger = setup_logger("chatbot.groq_model")
+
+MODEL = "meta-llama/llama-4-maverick-17b-128e-instruct"
+# Alternative endpoint, e.g. a local stub server for tests (unset = Groq's API)
+GROQ_BASE_URL = os.getenv("GROQ_BASE_URL") or None
+# Seconds one answer may take, retries and backoff included
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", "10"))
+# Retries after a timeout, connection error, 429 or 5xx; backoff base in seconds
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", "2"))
+GROQ_BACKOFF = float(os.getenv("GROQ_BACKOFF", "0.25"))
+# Pooled keep-alive connections to the API
+GROQ_POOL_SIZE = int(os.getenv("GROQ_POOL_SIZE", "20"))
+# Consecutive failures that open the circuit breaker, and seconds it stays open
+GROQ_BREAKER_FAILURES = int(os.getenv("GROQ_BREAKER_FAILURES", "5"))
+GROQ_BREAKER_RESET = float(os.getenv("GROQ_BREAKER_RESET", "30"))
+
+client = LLMClient(
+    api_key=os.environ.get("GROQ_API_KEY"),
+    base_url=GROQ_BASE_URL,
+    timeout=GROQ_TIMEOUT,
+    max_retries=GROQ_MAX_RETRIES,
+    backoff=GROQ_BACKOFF,
+    pool_size=GROQ_POOL_SIZE,
+    breaker=CircuitBreaker(GROQ_BREAKER_FAILURES, GROQ_BREAKER_RESET),
 )
 
 
-def answer(query:str, intent) -> str:
-    chat_completion = client.chat.completions.create(
-        messages=[
-            {
-                "role":'system',
-                "content":'You are a PTU SUPPORT webpage assitant that helps students to get anaswer from the knowlwdge you have with intent provided before the query. PTU stands for Punjab Technical University and also reffered as IKGPTU (Inder Kumar Gujral Punjab Techincal Unversity). Don\'t let user know about intent and always answer in a friendly manner. If you are not sure about the answer, politely let the user know that you are unable to provide the information they are looking for. Always keep your answers short and precise. If the user query is not related to PTU, politely let them know that you can only assist with PTU related queries and suggest them to contact support for further assistance.'
-            },
-            {
-                "role": "user",
-                "content":f",'intent': {intent},'query': {query},"
-                
-            }
-        ],
-        model="meta-llama/llama-4-maverick-17b-128e-instruct",
-    )
-    response = chat_completion.choices[0].message.content
+def build_messages(query: str, intent) -> list:
+    return [
+        {
+            "role":'system',
+            "content":'You are a PTU SUPPORT webpage assitant that helps students to get anaswer from the knowlwdge you have with intent provided before the query. PTU stands for Punjab Technical University and also reffered as IKGPTU (Inder Kumar Gujral Punjab Techincal Unversity). Don\'t let user know about intent and always answer in a friendly manner. If you are not sure about the answer, politely let the user know that you are unable to provide the information they are looking for. Always keep your answers short and precise. If the user query is not related to PTU, politely let them know that you can only assist with PTU related queries and suggest them to contact support for further assistance.'
+        },
+        {
+            "role": "user",
+            "content":f",'intent': {intent},'query': {query},"
+
+        }
+    ]
+
+
+def answer_with_status(query: str, intent) -> Tuple[str, bool]:
+    """
+    returns (html answer, degraded); degraded answers are the retrieved intent itself,
+    used when the llm is unavailable
+    """
+    try:
+        response = client.complete(messages=build_messages(query, intent), model=MODEL)
+    except LLMUnavailable as error:
+        logger.warning(f"LLM unavailable ({error}), answering with the retrieved intent")
+        return markdown.markdown(str(intent)), True
     result = markdown.markdown(response)
-    return result
+    return result, False
+
+
+def answer(query:str, intent) -> str:
+    return answer_with_status(query, intent)[0]
+
+
+def stream_answer(query: str, intent) -> Iterator[Tuple[str, bool]]:
+    """
+    yields (markdown text, degraded) pieces of the answer as the llm produces them; when the
+    llm is unavailable before its first token the whole retrieved intent is yielded instead,
+    when it fails later the answer ends where the stream broke off
+    """
+    started = False
+    try:
+        for content in client.stream(messages=build_messages(query, intent), model=MODEL):
+            started = True
+            yield content, False
+    except LLMUnavailable as error:
+        if started:
+            logger.warning(f"LLM stream broke off ({error})")
+            yield "", True
+            return
+        logger.warning(f"LLM unavailable ({error}), answering with the retrieved intent")
+        yield str(intent), True
@@ -0,0 +1,114 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, List, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger("chatbot.hybrid")
+
+# Smoothing constant of reciprocal rank fusion; 60 is the usual choice
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+# Answers fetched from each stage before fusing
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+# Time each stage may take, counted from the moment both stages start
+LEXICAL_BUDGET_MS = float(os.getenv("HYBRID_LEXICAL_BUDGET_MS", "50"))
+SEMANTIC_BUDGET_MS = float(os.getenv("HYBRID_SEMANTIC_BUDGET_MS", "250"))
+
+# A stage takes (query, n) and returns up to n (answer, score) pairs, best first
+Search = Callable[[str, int], List[Tuple[str, float]]]
+
+
+def answer_key(answer: str) -> str:
+    return " ".join(answer.split())
+
+
+def reciprocal_rank_fusion(rankings: Dict[str, List[Tuple[str, float]]], rrf_k: int = RRF_K) -> List[Dict]:
+    """
+    Fuses the rankings of every stage into one list of
+    {"answer", "score", <stage>: stage score or None}, best first.
+    An answer at rank r of a stage adds 1 / (rrf_k + r); ranks count distinct answers,
+    so an answer stored under several questions is not counted twice.
+    Ties keep the order of the stages in `rankings`.
+    """
+    fused: Dict[str, Dict] = {}
+    for stage, hits in rankings.items():
+        rank = 0
+        for answer, score in hits:
+            entry = fused.setdefault(
+                answer_key(answer), {"answer": answer, "score": 0.0, **{name: None for name in rankings}}
+            )
+            if entry[stage] is not None:
+                continue
+            rank += 1
+            entry["score"] += 1 / (rrf_k + rank)
+            entry[stage] = score
+    return sorted(fused.values(), key=lambda entry: -entry["score"])
+
+
+class HybridRetriever:
+    """
+    Runs the lexical (TF-IDF) and semantic (embedding) searches concurrently and fuses
+    their rankings with reciprocal rank fusion.
+
+    Every stage has a time budget. A stage that overruns is left out of the fusion, so a
+    slow embedding search degrades to the lexical ranking alone; if the lexical stage
+    overruns as well, its result is still awaited since it is the fallback.
+    Each stage has its own thread pool, so a backlog of slow semantic searches never
+    delays the lexical one.
+    """
+
+    def __init__(
+        self,
+        lexical_search: Search,
+        semantic_search: Search,
+        lexical_budget_ms: float = LEXICAL_BUDGET_MS,
+        semantic_budget_ms: float = SEMANTIC_BUDGET_MS,
+        candidates: int = HYBRID_CANDIDATES,
+        rrf_k: int = RRF_K,
+        workers_per_stage: int = 4,
+    ):
+        self.stages = {"lexical": lexical_search, "semantic": semantic_search}
+        self.budgets = {"lexical": lexical_budget_ms / 1000, "semantic": semantic_budget_ms / 1000}
+        self.candidates = candidates
+        self.rrf_k = rrf_k
+        self._executors = {
+            stage: ThreadPoolExecutor(max_workers=workers_per_stage, thread_name_prefix=f"hybrid-{stage}")
+            for stage in self.stages
+        }
+        self.stats = {"queries": 0}
+        for stage in self.stages:
+            self.stats[f"{stage}_timeouts"] = self.stats[f"{stage}_errors"] = 0
+
+    def retrieve(self, query: str, k: int = 3) -> List[Dict]:
+        """Top-k fused hits for the query, see reciprocal_rank_fusion."""
+        self.stats["queries"] += 1
+        start = time.perf_counter()
+        futures = {
+            stage: self._executors[stage].submit(search, query, self.candidates) for stage, search in self.stages.items()
+        }
+
+        rankings: Dict[str, List[Tuple[str, float]]] = {}
+        for stage, future in futures.items():
+            remaining = self.budgets[stage] - (time.perf_counter() - start)
+            try:
+                try:
+                    rankings[stage] = future.result(timeout=max(remaining, 0))
+                except FutureTimeout:
+                    self.stats[f"{stage}_timeouts"] += 1
+                    logger.warning(f"{stage} retrieval exceeded its {self.budgets[stage] * 1000:.0f} ms budget")
+                    if stage == "lexical":
+                        # the lexical ranking is the fallback, so it is awaited anyway
+                        rankings[stage] = future.result()
+            except Exception:
+                self.stats[f"{stage}_errors"] += 1
+                logger.exception(f"{stage} retrieval failed")
+
+        logger.info(
+            f"Hybrid retrieval used {', '.join(rankings) or 'no stages'} "
+            f"in {(time.perf_counter() - start) * 1000:.1f} ms"
+        )
+        # every hit carries a score key per stage, None for stages left out
+        for stage in self.stages:
+            rankings.setdefault(stage, [])
+        return reciprocal_rank_fusion(rankings, self.rrf_k)[:k]
@@ -0,0 +1,216 @@
+import random
+import threading
+import time
+from typing import Iterator
+
+import httpx
+from groq import APIConnectionError, APIStatusError, APITimeoutError, Groq, GroqError
+
+from utils.logger import setup_logger
+
+logger = setup_logger("chatbot.llm_client")
+
+
+class LLMUnavailable(Exception):
+    """The LLM could not answer in time: breaker open, deadline passed or retries exhausted."""
+
+
+class CircuitBreaker:
+    """
+    Stops calls to a failing upstream. After `failure_threshold` consecutive failures the
+    breaker opens and rejects calls for `reset_timeout` seconds; then one trial call is let
+    through (half open), which closes the breaker on success or reopens it on failure.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                return "open"
+            return "half_open"
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._trial_running:
+                return False
+            self._trial_running = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            if self._opened_at is not None:
+                logger.info("Circuit breaker closed")
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def release(self):
+        """Ends a call that neither succeeded nor failed, so a half-open trial can be made again."""
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_running or (self._opened_at is None and self._failures >= self.failure_threshold):
+                logger.warning(f"Circuit breaker opened after {self._failures} consecutive failures")
+                self._opened_at = time.monotonic()
+            self._trial_running = False
+
+
+class LLMClient:
+    """
+    Groq chat completions with a pooled HTTP transport, a deadline per call, bounded
+    retries with jittered exponential backoff and a circuit breaker.
+
+    Timeouts, connection errors, 429 and 5xx responses are retried while the deadline
+    allows and count as breaker failures; other 4xx responses are raised at once.
+    complete() and stream() raise LLMUnavailable whenever no answer can be had, so callers can
+    fall back to a local answer instead of holding a worker thread.
+    The Groq client is created on first use, so importing needs no API key.
+    """
+
+    def __init__(
+        self,
+        api_key: str = None,
+        base_url: str = None,
+        timeout: float = 10.0,
+        max_retries: int = 2,
+        backoff: float = 0.25,
+        pool_size: int = 20,
+        breaker: CircuitBreaker = None,
+    ):
+        self.api_key = api_key
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.pool_size = pool_size
+        self.breaker = breaker or CircuitBreaker()
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self) -> Groq:
+        with self._client_lock:
+            if self._client is None:
+                http_client = httpx.Client(
+                    limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+                    timeout=self.timeout,
+                )
+                # retries are done here, with jitter and the breaker in the loop
+                self._client = Groq(
+                    api_key=self.api_key, base_url=self.base_url, http_client=http_client, max_retries=0
+                )
+            return self._client
+
+    @staticmethod
+    def _retryable(error: Exception) -> bool:
+        # transport errors surface as they are while a stream is being read
+        if isinstance(error, (APITimeoutError, APIConnectionError, httpx.TransportError)):
+            return True
+        return isinstance(error, APIStatusError) and (error.status_code == 429 or error.status_code >= 500)
+
+    def _get_client(self) -> Groq:
+        try:
+            return self.client
+        except GroqError as error:
+            # e.g. no API key configured
+            raise LLMUnavailable(str(error)) from error
+
+    def _check_attempt(self, deadline: float) -> float:
+        """Seconds left for the next attempt; raises LLMUnavailable when none may be made."""
+        # the deadline goes first: allow() claims the half-open trial, which must then be made
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise LLMUnavailable("deadline exceeded")
+        if not self.breaker.allow():
+            raise LLMUnavailable("circuit breaker is open")
+        return remaining
+
+    def _handle_failure(self, error: Exception, attempt: int, deadline: float) -> None:
+        """Raises errors that are not retried, otherwise records the failure and backs off."""
+        if not self._retryable(error):
+            # the upstream is healthy, the request is wrong
+            self.breaker.record_success()
+            raise error
+        self.breaker.record_failure()
+        logger.warning(f"LLM call failed (attempt {attempt + 1}/{self.max_retries + 1}): {error!r}")
+        # full jitter, never sleeping past the deadline
+        sleep_for = min(random.uniform(0, self.backoff * 2**attempt), deadline - time.monotonic())
+        if attempt < self.max_retries and sleep_for > 0:
+            time.sleep(sleep_for)
+
+    def complete(self, messages, model: str, timeout: float = None) -> str:
+        """Content of the first completion choice, within `timeout` seconds (default self.timeout)."""
+        deadline = time.monotonic() + (timeout or self.timeout)
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            remaining = self._check_attempt(deadline)
+            try:
+                chat_completion = client.with_options(timeout=remaining).chat.completions.create(
+                    messages=messages, model=model
+                )
+            except Exception as error:
+                self._handle_failure(error, attempt, deadline)
+                continue
+            self.breaker.record_success()
+            return chat_completion.choices[0].message.content
+        raise LLMUnavailable(f"no answer after {self.max_retries + 1} attempts")
+
+    def stream(self, messages, model: str, timeout: float = None) -> Iterator[str]:
+        """
+        Yields the content of a streamed completion as it arrives. The first token must come
+        within `timeout` seconds (default self.timeout), retries included, and no later gap
+        may exceed what was left of it. Failures after the first token are not retried, since
+        the caller has already passed part of the answer on: they raise LLMUnavailable.
+        """
+        deadline = time.monotonic() + (timeout or self.timeout)
+        client = self._get_client()
+        for attempt in range(self.max_retries + 1):
+            remaining = self._check_attempt(deadline)
+            started = finished = False
+            try:
+                with client.with_options(timeout=remaining).chat.completions.create(
+                    messages=messages, model=model, stream=True
+                ) as chunks:
+                    for chunk in chunks:
+                        if not chunk.choices:
+                            continue
+                        content = chunk.choices[0].delta.content
+                        if content:
+                            started = True
+                            yield content
+                        finished = finished or chunk.choices[0].finish_reason is not None
+                if not finished:
+                    # the connection closed before the last chunk
+                    raise httpx.RemoteProtocolError("stream ended without a finish reason")
+            except GeneratorExit:
+                # the caller stopped reading (e.g. the browser went away): tokens mean the upstream
+                # works, otherwise the attempt says nothing about it
+                if started:
+                    self.breaker.record_success()
+                else:
+                    self.breaker.release()
+                raise
+            except Exception as error:
+                if started and self._retryable(error):
+                    self.breaker.record_failure()
+                    raise LLMUnavailable(f"stream interrupted: {error!r}") from error
+                self._handle_failure(error, attempt, deadline)
+                continue
+            self.breaker.record_success()
+            return
+        raise LLMUnavailable(f"no answer after {self.max_retries + 1} attempts")
@@ -3,13 +3,23 @@ from __future__ import annotations
 import os
 import json
 import argparse
+import hashlib
+import re
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict
+from typing import Any, Callable, List, Dict, Tuple
+import numpy as np
 import pandas as pd
 from sentence_transformers import SentenceTransformer
 from transformers import pipeline, AutoModelForSeq2SeqLM, AutoTokenizer
 import chromadb
 
+from app.chatbot.batching import DECODING_PRESETS, BatchingNaturalizer
+from app.chatbot.embedding_cache import EmbeddingCache
+from app.chatbot.embedding_pipeline import EmbeddingPipeline
+from app.chatbot.vector_index import INDEX_FORMAT_VERSION, VECTOR_INDEX_DIR, NumpyVectorIndex
+
 
 # ----------------------------
 # Paths
@@ -29,11 +39,40 @@ RESPONSES_JSON = DATA_DIR / "responses.json"
 
 # Chroma will persist inside models/ folder
 CHROMA_DIR = str(MODELS_DIR / "chroma_db")
+PASSAGE_INDEX_DIR = MODELS_DIR / "passage_index"
+# Vector stores: whole questions and overlapping passages of the answers
+STORES = {
+    "questions": {"collection": "ptu_collection", "index_dir": VECTOR_INDEX_DIR},
+    "passages": {"collection": "ptu_passages", "index_dir": PASSAGE_INDEX_DIR},
+}
 EMBEDDER_NAME_PATH = MODELS_DIR / "embedder_name.txt"
+# answer id -> answer text, shared by every vector store entry with that answer
+ANSWERS_PATH = MODELS_DIR / "answers.json"
 
 # Default embedding + LLM
 DEFAULT_EMBEDDER = "sentence-transformers/all-MiniLM-L6-v2"
 DEFAULT_NATURALIZER = os.getenv("HF_NATURALIZER_MODEL", "google/flan-t5-base")
+# Queries per transformer forward pass when encoding a batch
+DEFAULT_ENCODE_BATCH_SIZE = int(os.getenv("RAG_ENCODE_BATCH_SIZE", "64"))
+
+# Vector store: "chroma" or "numpy" (memory-mapped matrix, see vector_index.py)
+VECTOR_BACKEND = os.getenv("RAG_VECTOR_BACKEND", "chroma")
+# numpy backend: IVF lists built (0 = flat exact search) and lists probed per query
+IVF_LISTS = int(os.getenv("RAG_IVF_LISTS", "0"))
+IVF_NPROBE = int(os.getenv("RAG_IVF_NPROBE", "8"))
+# numpy backend: "int8" stores quantized vectors; RAG_RESCORE candidates are rescored in float32
+VECTOR_DTYPE = os.getenv("RAG_VECTOR_DTYPE", "float32")
+RESCORE_CANDIDATES = int(os.getenv("RAG_RESCORE", "32"))
+
+# Naturalizer batching: prompts per generate call, longest wait for a batch to fill,
+# and the decoding preset ("greedy" or "beam", see batching.py)
+NATURALIZER_BATCH_SIZE = int(os.getenv("RAG_NATURALIZER_BATCH_SIZE", "8"))
+NATURALIZER_MAX_WAIT_MS = float(os.getenv("RAG_NATURALIZER_MAX_WAIT_MS", "20"))
+DEFAULT_DECODING = os.getenv("RAG_DECODING", "beam")
+
+# Answer passages: words per passage and words shared by consecutive passages
+PASSAGE_WORDS = int(os.getenv("RAG_PASSAGE_WORDS", "64"))
+PASSAGE_OVERLAP = int(os.getenv("RAG_PASSAGE_OVERLAP", "16"))
 
 
 # ----------------------------
@@ -50,37 +89,80 @@ def find_existing_csv() -> Path | None:
     return None
 
 
-def load_documents() -> List[Dict[str, str]]:
+def answer_id(answer: str) -> str:
+    """Id of an answer text in the answer table: hash of the text, so identical answers share it."""
+    return hashlib.sha256(answer.encode("utf-8")).hexdigest()[:16]
+
+
+def question_key(question: str) -> str:
+    """Questions that only differ in case or whitespace are the same question."""
+    return " ".join(question.split()).casefold()
+
+
+class DocumentSet:
+    """
+    Q/A pairs merged from every source. Each answer text is stored once in `answers`
+    (answer id -> text) and documents only reference it by id.
+    The first source to bring a question wins; later duplicates are dropped.
+    """
+
+    def __init__(self) -> None:
+        self.docs: Dict[str, Dict[str, str]] = {}
+        self.answers: Dict[str, str] = {}
+        self.duplicates = 0
+
+    def add(self, questions, answer: str) -> int:
+        """Adds every question with the same answer and returns how many were new."""
+        aid = answer_id(answer)
+        added = 0
+        for q in questions:
+            key = question_key(q)
+            if key in self.docs:
+                self.duplicates += 1
+                continue
+            self.docs[key] = {"question": q, "answer_id": aid}
+            added += 1
+        if added:
+            self.answers.setdefault(aid, answer)
+        return added
+
+    def __len__(self) -> int:
+        return len(self.docs)
+
+
+def find_csv_columns(columns) -> tuple[str, str]:
+    col_q = next((c for c in ["User Query (Pattern)", "Pattern", "User Query", "Question"] if c in columns), None)
+    col_a = next((c for c in ["Bot Response", "Response", "Answer"] if c in columns), None)
+    if not col_q or not col_a:
+        raise ValueError(f"CSV missing Q/A columns. Found: {list(columns)}")
+    return col_q, col_a
+
+
+def load_documents() -> DocumentSet:
     """
-    Merge your CSV and JSONs into a list of {"question": str, "answer": str}.
+    Merge your CSV and JSONs into one DocumentSet of {"question": str, "answer_id": str}
+    documents plus the answer table they point into.
     """
-    docs: List[Dict[str, str]] = []
+    documents = DocumentSet()
 
     # CSV
     csv_path = find_existing_csv()
     if csv_path:
         log(f"Loading CSV: {csv_path.relative_to(HERE)}")
-        df = pd.read_csv(csv_path, encoding="utf-8")
-
-        col_q, col_a = None, None
-        for cand in ["User Query (Pattern)", "Pattern", "User Query", "Question"]:
-            if cand in df.columns:
-                col_q = cand
-                break
-        for cand in ["Bot Response", "Response", "Answer"]:
-            if cand in df.columns:
-                col_a = cand
-                break
-        if not col_q or not col_a:
-            raise ValueError(f"CSV missing Q/A columns. Found: {list(df.columns)}")
-
-        df[col_q] = df[col_q].fillna("").astype(str).str.strip()
-        df[col_a] = df[col_a].fillna("").astype(str).str.strip()
-
-        for _, row in df.iterrows():
-            if row[col_q] and row[col_a]:
-                docs.append({"question": row[col_q], "answer": row[col_a]})
-        log(f"  -> {len(docs)} rows from CSV")
+        col_q, col_a = find_csv_columns(pd.read_csv(csv_path, encoding="utf-8", nrows=0).columns)
+        df = pd.read_csv(csv_path, encoding="utf-8", usecols=[col_q, col_a], dtype=str).fillna("")
+        questions, answers = df[col_q].str.strip(), df[col_a].str.strip()
+        keep = (questions != "") & (answers != "")
+        questions, answers = questions[keep], answers[keep]
+        # the first row of a question wins, as with the other sources
+        repeated = questions.str.split().str.join(" ").str.casefold().duplicated()
+        documents.duplicates += int(repeated.sum())
+        questions, answers = questions[~repeated], answers[~repeated]
+        # one add() per distinct answer instead of one per row
+        count = 0
+        for ans, group in questions.groupby(answers, sort=False):
+            count += documents.add(group.tolist(), ans)
+        log(f"  -> {count} rows from CSV")
 
     # intents.json
     if INTENTS_JSON.exists():
@@ -90,10 +172,8 @@ def load_documents() -> List[Dict[str, str]]:
         for intent in intents:
             pats, resps = intent.get("patterns", []), intent.get("responses", [])
             default_resp = resps[0] if resps else ""
-            for p in pats:
-                if p and default_resp:
-                    docs.append({"question": p, "answer": default_resp})
-                    count += 1
+            if default_resp:
+                count += documents.add([p for p in pats if p], default_resp)
         log(f"  -> {count} rows from intents.json")
 
     # responses.json
@@ -103,64 +183,419 @@ def load_documents() -> List[Dict[str, str]]:
         if isinstance(resp_obj, dict):
             count = 0
             for q, a in resp_obj.items():
-                if q and a:
-                    docs.append({"question": q.strip(), "answer": a.strip()})
-                    count += 1
+                if q and a and q.strip() and a.strip():
+                    count += documents.add([q.strip()], a.strip())
             log(f"  -> {count} rows from responses.json")
 
-    if not docs:
+    if not documents:
         raise FileNotFoundError("No documents found in CSV/JSONs.")
-    return docs
+    if documents.duplicates:
+        log(f"  -> merged {documents.duplicates} duplicate questions")
+    log(f"  -> {len(documents)} questions sharing {len(documents.answers)} answers")
+    return documents
+
+
+# ----------------------------
+# Passages
+# ----------------------------
+def chunk_answer(answer: str, max_words: int = PASSAGE_WORDS, overlap: int = PASSAGE_OVERLAP) -> List[Tuple[int, int]]:
+    """
+    (start, end) character spans of overlapping passages of at most max_words words,
+    each starting `overlap` words before the previous one ended. A short answer is one passage.
+    """
+    words = [(m.start(), m.end()) for m in re.finditer(r"\S+", answer)]
+    if not words:
+        return []
+    stride = max(1, max_words - overlap)
+    spans = []
+    for first in range(0, len(words), stride):
+        last = min(first + max_words, len(words)) - 1
+        spans.append((words[first][0], words[last][1]))
+        if last == len(words) - 1:
+            break
+    return spans
+
+
+def passage_ref(answer_id: str, start: int, end: int) -> str:
+    """Ref of a passage: the span of its parent answer, so no passage text is stored."""
+    return f"{answer_id}:{start}:{end}"
+
+
+def parse_passage_ref(ref: str) -> Tuple[str, int, int]:
+    aid, start, end = ref.rsplit(":", 2)
+    return aid, int(start), int(end)
 
 
 # ----------------------------
-# ChromaDB Index
+# Vector stores
 # ----------------------------
-def build_index(embedder_name: str = DEFAULT_EMBEDDER) -> None:
-    log("Building Chroma index from data...")
-    docs = load_documents()
+def doc_id(key: str) -> str:
+    """
+    Stable id of a vector store entry: hash of its key, the question of a Q/A pair
+    (so an edited answer keeps its id) or the ref of a passage.
+    """
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
 
-    embedder = SentenceTransformer(embedder_name)
-    chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
 
-    # reset old collection
-    if "ptu_collection" in [c.name for c in chroma_client.list_collections()]:
-        chroma_client.delete_collection("ptu_collection")
+def content_hash(text: str, ref: str) -> str:
+    return hashlib.sha256(f"{text}\0{ref}".encode("utf-8")).hexdigest()
 
-    collection = chroma_client.create_collection("ptu_collection")
 
-    questions = [d["question"] for d in docs]
-    answers = [d["answer"] for d in docs]
-    embeddings = embedder.encode(questions, convert_to_numpy=True).tolist()
+def diff_pairs(existing_hashes: Dict[str, str], new_hashes: Dict[str, str]) -> Tuple[List[str], List[str], List[str]]:
+    """Ids of the entries added, updated (content changed) and removed between two builds."""
+    added = [id_ for id_ in new_hashes if id_ not in existing_hashes]
+    updated = [id_ for id_ in new_hashes if id_ in existing_hashes and existing_hashes[id_] != new_hashes[id_]]
+    removed = [id_ for id_ in existing_hashes if id_ not in new_hashes]
+    return added, updated, removed
 
-    collection.add(
-        embeddings=embeddings,
-        documents=questions,
-        metadatas=[{"answer": a} for a in answers],
-        ids=[str(i) for i in range(len(questions))],
-    )
+
+def sync_chroma(store: str, entries: Dict[str, Dict[str, str]], embedder_name: str, rebuild: bool):
+    """Upserts new and changed {"text", "ref"} entries into the store's collection and deletes removed ones."""
+    collection_name = STORES[store]["collection"]
+    chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
+    if rebuild:
+        # vectors from another embedder are not comparable, start over
+        if collection_name in [c.name for c in chroma_client.list_collections()]:
+            chroma_client.delete_collection(collection_name)
+    collection = chroma_client.get_or_create_collection(collection_name)
+
+    existing = collection.get(include=["metadatas"])
+    existing_hashes = {
+        # entries written before refs existed are rewritten
+        id_: meta.get("content_hash") if "ref" in meta else None
+        for id_, meta in zip(existing["ids"], [m or {} for m in existing["metadatas"]])
+    }
+    new_hashes = {id_: content_hash(e["text"], e["ref"]) for id_, e in entries.items()}
+    added, updated, removed = diff_pairs(existing_hashes, new_hashes)
+
+    if removed:
+        collection.delete(ids=removed)
+
+    changed = added + updated
+    if changed:
+        with EmbeddingPipeline(embedder_name, log=log) as embedding_pipeline:
+            texts = [entries[id_]["text"] for id_ in changed]
+            for start, embeddings in embedding_pipeline.embed(texts, label=store):
+                chunk = changed[start:start + len(embeddings)]
+                collection.upsert(
+                    embeddings=embeddings.tolist(),
+                    documents=texts[start:start + len(embeddings)],
+                    metadatas=[{"ref": entries[id_]["ref"], "content_hash": new_hashes[id_]} for id_ in chunk],
+                    ids=chunk,
+                )
+    return added, updated, removed
+
+
+def write_vector_index(store: str, entries: Dict[str, Dict[str, str]], embedder_name: str, rebuild: bool):
+    """
+    Rewrites the store's numpy vector index. Every entry is written, but only entries
+    missing from the embedding cache go through the embedder.
+    """
+    index_dir = STORES[store]["index_dir"]
+    previous = NumpyVectorIndex.read_meta(index_dir)
+    layout = {"version": INDEX_FORMAT_VERSION, "embedder": embedder_name, "nlist": IVF_LISTS, "dtype": VECTOR_DTYPE}
+    if rebuild or (previous and any(previous.get(key) != value for key, value in layout.items())):
+        previous = None
+    existing_hashes = dict(zip(previous["ids"], previous["content_hashes"])) if previous else {}
+    new_hashes = {id_: content_hash(e["text"], e["ref"]) for id_, e in entries.items()}
+    added, updated, removed = diff_pairs(existing_hashes, new_hashes)
+
+    if added or updated or removed or not previous:
+        ids = list(entries)
+        # embeddings are streamed into a memory-mapped staging file, never held whole
+        index_dir.mkdir(parents=True, exist_ok=True)
+        staging_path = index_dir / f"staging-{os.getpid()}.npy"
+        staging = None
+        try:
+            with EmbeddingPipeline(embedder_name, log=log) as embedding_pipeline:
+                texts = [entries[id_]["text"] for id_ in ids]
+                for start, embeddings in embedding_pipeline.embed(texts, label=store):
+                    if staging is None:
+                        staging = np.lib.format.open_memmap(
+                            staging_path, mode="w+", dtype=np.float32, shape=(len(ids), embeddings.shape[1])
+                        )
+                    staging[start:start + len(embeddings)] = embeddings
+            staging.flush()
+            NumpyVectorIndex.build(
+                ids=ids,
+                refs=[entries[id_]["ref"] for id_ in ids],
+                content_hashes=[new_hashes[id_] for id_ in ids],
+                embeddings=staging,
+                embedder_name=embedder_name,
+                index_dir=index_dir,
+                nlist=IVF_LISTS,
+                dtype=VECTOR_DTYPE,
+            )
+        finally:
+            del staging
+            staging_path.unlink(missing_ok=True)
+    return added, updated, removed
+
+
+def build_index(embedder_name: str = DEFAULT_EMBEDDER, full: bool = False, backend: str = VECTOR_BACKEND) -> Dict[str, int]:
+    """
+    Brings both vector stores of `backend` in line with the data files: "questions"
+    (one entry per question, pointing at its answer) and "passages" (overlapping
+    chunks of every answer). Only new or changed entries are embedded, and entries
+    no longer in the data are dropped.
+    A different embedder (or full=True) rebuilds the stores from scratch.
+    Returns the number of questions added, updated, removed and unchanged.
+    """
+    if backend not in ("chroma", "numpy"):
+        raise ValueError(f"Unknown vector backend: {backend}")
+    log(f"Building {backend} index from data...")
+    documents = load_documents()
+    store_entries = {
+        "questions": {
+            doc_id(d["question"]): {"text": d["question"], "ref": d["answer_id"]} for d in documents.docs.values()
+        },
+        "passages": {},
+    }
+    for aid, text in documents.answers.items():
+        for start, end in chunk_answer(text):
+            ref = passage_ref(aid, start, end)
+            store_entries["passages"][doc_id(ref)] = {"text": text[start:end], "ref": ref}
+
+    # written first: a store entry never points at an answer the table does not have
+    tmp_path = ANSWERS_PATH.with_suffix(f".{os.getpid()}.tmp")
+    tmp_path.write_text(json.dumps(documents.answers, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, ANSWERS_PATH)
+
+    previous_embedder = EMBEDDER_NAME_PATH.read_text(encoding="utf-8").strip() if EMBEDDER_NAME_PATH.exists() else None
+    rebuild = full or previous_embedder != embedder_name
+    summaries = {}
+    for store, entries in store_entries.items():
+        sync = write_vector_index if backend == "numpy" else sync_chroma
+        added, updated, removed = sync(store, entries, embedder_name, rebuild)
+        summaries[store] = {
+            "added": len(added),
+            "updated": len(updated),
+            "removed": len(removed),
+            "unchanged": len(entries) - len(added) - len(updated),
+        }
+        log(f"  -> {store}: " + ", ".join(f"{count} {name}" for name, count in summaries[store].items()))
 
     EMBEDDER_NAME_PATH.write_text(embedder_name, encoding="utf-8")
+    # the cached stores (and possibly embedder) belong to the old index
+    registry.reset()
+
     log("✅ Build complete.")
+    return summaries["questions"]
+
+
+class ChromaBackend:
+    """Vector search through a persisted Chroma collection; hits are (ref, cosine)."""
+
+    def __init__(self, collection) -> None:
+        self.collection = collection
+
+    def search(self, embeddings: np.ndarray, k: int = 3) -> List[List[Tuple[str, float]]]:
+        results = self.collection.query(
+            query_embeddings=np.asarray(embeddings).tolist(), n_results=k, include=["metadatas", "distances"]
+        )
+        # Chroma returns squared L2 distances; for unit vectors cosine = 1 - d / 2
+        return [
+            [(m["ref"], 1 - d / 2) for m, d in zip(metadatas, distances)]
+            for metadatas, distances in zip(results["metadatas"], results["distances"])
+        ]
+
+
+# ----------------------------
+# Model registry
+# ----------------------------
+class ModelRegistry:
+    """
+    Process-wide, lazily initialized cache of the embedder, the Chroma collection and
+    the naturalizer pipelines. Each resource is loaded once, under its own lock, so a slow
+    naturalizer load never blocks retrieval. Load times are kept in `load_timings`.
+    """
+
+    def __init__(self) -> None:
+        self._guard = threading.Lock()
+        self._locks: Dict[str, threading.Lock] = {}
+        self._values: Dict[str, Any] = {}
+        self.load_timings: Dict[str, float] = {}
+
+    def _get(self, name: str, loader: Callable[[], Any]) -> Any:
+        value = self._values.get(name)
+        if value is not None:
+            return value
+        with self._guard:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            value = self._values.get(name)
+            if value is None:
+                start = time.perf_counter()
+                value = loader()
+                self.load_timings[name] = time.perf_counter() - start
+                log(f"Loaded {name} in {self.load_timings[name]:.2f}s")
+                self._values[name] = value
+        return value
+
+    def embedder_name(self) -> str:
+        if not EMBEDDER_NAME_PATH.exists():
+            build_index()
+        return EMBEDDER_NAME_PATH.read_text(encoding="utf-8").strip()
+
+    def embedder(self) -> SentenceTransformer:
+        return self._get("embedder", lambda: SentenceTransformer(self.embedder_name()))
+
+    def collection(self, store: str = "questions"):
+        def load_collection():
+            client = chromadb.PersistentClient(path=CHROMA_DIR)
+            name = STORES[store]["collection"]
+            # builds the index on first use
+            if not EMBEDDER_NAME_PATH.exists() or name not in [c.name for c in client.list_collections()]:
+                build_index(backend="chroma")
+            return client.get_collection(name)
+
+        return self._get(f"collection:{store}", load_collection)
+
+    def backend(self, store: str = "questions"):
+        """The configured vector store of `store`, built on first use when missing."""
+
+        def load_backend():
+            if VECTOR_BACKEND == "numpy":
+                index_dir = STORES[store]["index_dir"]
+                meta = NumpyVectorIndex.read_meta(index_dir)
+                if meta is None or meta.get("version") != INDEX_FORMAT_VERSION:
+                    build_index(backend="numpy")
+                return NumpyVectorIndex(index_dir, nprobe=IVF_NPROBE, rescore=RESCORE_CANDIDATES)
+            return ChromaBackend(self.collection(store))
+
+        return self._get(f"backend:{store}", load_backend)
+
+    def answers(self) -> Dict[str, str]:
+        def load_answers():
+            if not ANSWERS_PATH.exists():
+                build_index()
+            return json.loads(ANSWERS_PATH.read_text(encoding="utf-8"))
+
+        return self._get("answers", load_answers)
+
+    def embedding_cache(self) -> EmbeddingCache:
+        return self._get("embedding_cache", lambda: EmbeddingCache(self.embedder_name()))
+
+    def naturalizer(self, model_name: str = DEFAULT_NATURALIZER):
+        return self._get(f"naturalizer:{model_name}", lambda: init_naturalizer(model_name))
+
+    def batcher(self, model_name: str = DEFAULT_NATURALIZER) -> BatchingNaturalizer:
+        return self._get(
+            f"batcher:{model_name}",
+            lambda: BatchingNaturalizer(
+                self.naturalizer(model_name),
+                max_batch_size=NATURALIZER_BATCH_SIZE,
+                max_wait_ms=NATURALIZER_MAX_WAIT_MS,
+            ),
+        )
+
+    def warmup(self, naturalizer: bool = True) -> Dict[str, float]:
+        """Loads everything up front, e.g. at process start, and returns the load timings."""
+        for store in STORES:
+            self.backend(store)
+        self.embedder()
+        if naturalizer:
+            self.batcher()
+        return dict(self.load_timings)
+
+    def reset(self) -> None:
+        """Drops everything built from the index; naturalizers do not depend on it and stay loaded."""
+        with self._guard:
+            for name in [n for n in self._values if not n.startswith(("naturalizer:", "batcher:"))]:
+                del self._values[name]
+                self.load_timings.pop(name, None)
+
+
+registry = ModelRegistry()
+
+
+def warmup(naturalizer: bool = True) -> Dict[str, float]:
+    return registry.warmup(naturalizer=naturalizer)
 
 
 def load_index_and_models():
-    if not EMBEDDER_NAME_PATH.exists():
-        build_index()
+    return registry.collection(), registry.embedder()
 
-    embedder_name = EMBEDDER_NAME_PATH.read_text(encoding="utf-8").strip()
-    embedder = SentenceTransformer(embedder_name)
-    chroma_client = chromadb.PersistentClient(path=CHROMA_DIR)
-    collection = chroma_client.get_collection("ptu_collection")
-    return collection, embedder
+
+def search_many(
+    user_queries: List[str], k: int = 3, batch_size: int = DEFAULT_ENCODE_BATCH_SIZE
+) -> List[List[Tuple[str, float]]]:
+    """
+    Top-k (answer, cosine similarity) hits for every query: one encode call for all
+    queries and one vector store search carrying all of their embeddings.
+    """
+    if not user_queries:
+        return []
+    backend = registry.backend()
+    answers = registry.answers()
+    q_embs = registry.embedding_cache().encode(
+        list(user_queries), registry.embedder, persist=False, batch_size=batch_size
+    )
+    return [
+        [(answers[aid], score) for aid, score in hits if aid in answers] for hits in backend.search(q_embs, k=k)
+    ]
+
+
+def retrieve_many(user_queries: List[str], k: int = 3, batch_size: int = DEFAULT_ENCODE_BATCH_SIZE) -> List[List[str]]:
+    return [[ans for ans, _ in hits] for hits in search_many(user_queries, k=k, batch_size=batch_size)]
 
 
 def retrieve(user_query: str, k: int = 3) -> List[str]:
-    collection, embedder = load_index_and_models()
-    q_emb = embedder.encode([user_query], convert_to_numpy=True).tolist()
-    results = collection.query(query_embeddings=q_emb, n_results=k)
-    answers = [m["answer"] for m in results["metadatas"][0]]
-    return answers
+    return retrieve_many([user_query], k=k)[0]
+
+
+def merge_spans(spans: List[Tuple[int, int]]) -> List[Tuple[int, int]]:
+    """Overlapping or touching spans merged, in text order."""
+    merged: List[Tuple[int, int]] = []
+    for start, end in sorted(spans):
+        if merged and start <= merged[-1][1]:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def search_passages_many(
+    user_queries: List[str],
+    k: int = 3,
+    passages_per_answer: int = 2,
+    batch_size: int = DEFAULT_ENCODE_BATCH_SIZE,
+) -> List[List[Tuple[str, float]]]:
+    """
+    Passage-level retrieval grouped by parent answer. For every query, the best passages
+    are grouped by the answer they come from; each of the top-k answers yields its
+    best `passages_per_answer` passages, merged where they overlap and joined in text
+    order, with the score of its best passage.
+    """
+    if not user_queries:
+        return []
+    backend = registry.backend("passages")
+    answers = registry.answers()
+    q_embs = registry.embedding_cache().encode(
+        list(user_queries), registry.embedder, persist=False, batch_size=batch_size
+    )
+    # enough candidates that k answers can still be filled when passages share a parent
+    all_hits = backend.search(q_embs, k=k * passages_per_answer * 2)
+
+    results = []
+    for hits in all_hits:
+        groups: Dict[str, Dict[str, Any]] = {}
+        for ref, score in hits:
+            aid, start, end = parse_passage_ref(ref)
+            if aid not in answers:
+                continue
+            group = groups.setdefault(aid, {"score": score, "spans": []})
+            if len(group["spans"]) < passages_per_answer:
+                group["spans"].append((start, end))
+        results.append([
+            (" … ".join(answers[aid][start:end] for start, end in merge_spans(group["spans"])), group["score"])
+            for aid, group in list(groups.items())[:k]
+        ])
+    return results
+
+
+def retrieve_passages(user_query: str, k: int = 3) -> List[str]:
+    return [text for text, _ in search_passages_many([user_query], k=k)[0]]
 
 
 # ----------------------------
@@ -173,8 +608,14 @@ def init_naturalizer(model_name: str = DEFAULT_NATURALIZER):
     return pipeline("text2text-generation", model=mdl, tokenizer=tok)
 
 
-def answer(user_query: str, use_llm: bool = True, k: int = 3) -> str:
-    hits = retrieve(user_query, k=k)
+def naturalize(prompt: str, preset: str = DEFAULT_DECODING) -> str:
+    """Generates through the batching scheduler, sharing generate calls with concurrent requests."""
+    return registry.batcher().generate(prompt, preset=preset)
+
+
+def answer(user_query: str, use_llm: bool = True, k: int = 3, decoding: str = DEFAULT_DECODING) -> str:
+    # whole answers are shown as they are; the naturalizer only gets the relevant passages
+    hits = retrieve(user_query, k=k) if not use_llm else retrieve_passages(user_query, k=k)
     if not hits:
         return "I’m not sure yet. Please rephrase or provide more details."
 
@@ -183,7 +624,6 @@ def answer(user_query: str, use_llm: bool = True, k: int = 3) -> str:
     if not use_llm:
         return f"Here’s what I found:\n{context}"
 
-    naturalizer = init_naturalizer()
     prompt = (
         "You are a helpful assistant for PTU students. "
         # "Use ONLY the context below to answer the student’s question clearly. "
@@ -193,11 +633,9 @@ def answer(user_query: str, use_llm: bool = True, k: int = 3) -> str:
         f"Context:\n{context}\n\n"
         f"Question: {user_query}\n\nAnswer:"
     )
-    out = naturalizer(prompt, max_new_tokens=160, num_beams=4)[0]["generated_text"].strip()
-    return out
+    return naturalize(prompt, preset=decoding)
 
 def chat(use_llm: bool = True, k: int = 3):
-    naturalizer = init_naturalizer()
     while True:
         try:
             user_query = input("You: ").strip()
@@ -220,7 +658,7 @@ def chat(use_llm: bool = True, k: int = 3):
             f"Context:\n{context}\n\n"
             f"Question: {user_query}\n\nAnswer:"
         )
-        out = naturalizer(prompt, max_new_tokens=160, num_beams=4)[0]["generated_text"].strip()
+        out = naturalize(prompt)
         print("Bot:",out)
 
 
@@ -234,23 +672,33 @@ def main(argv: List[str] | None = None) -> None:
 
     p_build = sub.add_parser("build", help="Build Chroma index")
     p_build.add_argument("--embedder", default=DEFAULT_EMBEDDER)
+    p_build.add_argument("--full", action="store_true", help="Re-embed every pair instead of only changed ones")
+    p_build.add_argument("--backend", choices=["chroma", "numpy"], default=VECTOR_BACKEND)
 
     p_ask = sub.add_parser("ask", help="Answer a single question")
     p_ask.add_argument("question")
     p_ask.add_argument("--no-llm", action="store_true")
     p_ask.add_argument("-k", type=int, default=3)
+    p_ask.add_argument("--decoding", choices=sorted(DECODING_PRESETS), default=DEFAULT_DECODING)
 
     p_chat = sub.add_parser("chat", help="Interactive chat")
     p_chat.add_argument("--no-llm", action="store_true")
     p_chat.add_argument("-k", type=int, default=3)
 
+    p_warmup = sub.add_parser("warmup", help="Load all models and report load timings")
+    p_warmup.add_argument("--no-llm", action="store_true")
+
     args = parser.parse_args(argv)
 
     if args.cmd == "build":
-        build_index(embedder_name=args.embedder)
+        build_index(embedder_name=args.embedder, full=args.full, backend=args.backend)
+    elif args.cmd == "warmup":
+        for name, seconds in warmup(naturalizer=(not args.no_llm)).items():
+            print(f"{name}: {seconds:.2f}s")
     elif args.cmd == "ask":
-        print(answer(args.question, use_llm=(not args.no_llm), k=args.k))
+        print(answer(args.question, use_llm=(not args.no_llm), k=args.k, decoding=args.decoding))
     elif args.cmd == "chat":
+        warmup(naturalizer=(not args.no_llm))
         log("Entering chat mode. Type 'exit' to quit.")
         while True:
             try:
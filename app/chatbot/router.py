@@ -0,0 +1,56 @@
+import os
+from collections import Counter
+from typing import Dict, Optional, Tuple
+
+from utils.logger import setup_logger
+
+logger = setup_logger("chatbot.router")
+
+# Intent matches covering at least this share of both the pattern and the message are answered without the LLM
+LOCAL_INTENT_THRESHOLD = float(os.getenv("LOCAL_INTENT_THRESHOLD", "1.0"))
+# TF-IDF matches at or above this score, scaled by the share of known query words, likewise
+LOCAL_TFIDF_THRESHOLD = float(os.getenv("LOCAL_TFIDF_THRESHOLD", "0.9"))
+
+
+class ConfidenceRouter:
+    """
+    Decides per message whether a local answer is certain enough to be sent as is
+    ("local") or the LLM should answer ("llm"), from the scores of the local matches
+    (see TFIDModel.local_matches). Sources are tried in threshold order, so a certain
+    TF-IDF hit is still answered locally when the intent match is weak.
+    Every decision is logged with its score and counted in stats, so the thresholds can
+    be tuned from the logs; a threshold above 1 sends every match of that source to the LLM.
+    Callers that can still answer a non-local message without the LLM (e.g. from the semantic
+    cache) route with record_llm=False and record the outcome themselves.
+    """
+
+    def __init__(self, intent_threshold: float = LOCAL_INTENT_THRESHOLD, tfidf_threshold: float = LOCAL_TFIDF_THRESHOLD):
+        self.thresholds = {"intent": intent_threshold, "tfidf": tfidf_threshold}
+        self.stats: Counter = Counter()
+
+    @staticmethod
+    def scores(matches: Dict[str, Tuple[str, float]]) -> Dict[str, float]:
+        return {source: score for source, (_, score) in matches.items()}
+
+    def route(self, matches: Dict[str, Tuple[str, float]], record_llm: bool = True) -> Optional[str]:
+        """The local answer to send, or None when the message should go to the LLM."""
+        for source, threshold in self.thresholds.items():
+            if source in matches and matches[source][1] >= threshold:
+                self.record(f"local ({source})", self.scores(matches))
+                return matches[source][0]
+        if record_llm:
+            self.record("llm", self.scores(matches))
+        return None
+
+    def record(self, decision: str, scores: Optional[Dict[str, float]] = None) -> None:
+        """Logs and counts a decision with the local scores; also used for answers served from a cache."""
+        self.stats[decision.split()[0]] += 1
+        if scores is None:
+            logger.info(f"Route {decision}")
+        else:
+            detail = ", ".join(f"{source} {score:.3f}" for source, score in scores.items()) or "no local match"
+            logger.info(f"Route {decision}: {detail}")
+
+    def metrics(self) -> Dict[str, float]:
+        total = sum(self.stats.values())
+        return {**self.stats, "messages": total, "llm_share": self.stats["llm"] / total if total else 0.0}
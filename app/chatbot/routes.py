@@ -1,8 +1,9 @@
 from datetime import datetime
-from flask import Blueprint, jsonify, render_template, request
+import json
+from flask import Blueprint, Response, jsonify, render_template, request, stream_with_context
 from flask_login import current_user, login_required
 from app.chatbot.forms import SupportForm
-from app.chatbot.utils import get_response, send_email_to_support
+from app.chatbot.utils import get_response, send_email_to_support, stream_response
 from dotenv import load_dotenv
 from app.chatbot.webpage_data import quick_link_categories
 from database.models import ChatMessage
@@ -26,14 +27,7 @@ def chat():
             
             # Get bot response
             response = get_response(user_message)
-            chat_message = ChatMessage(user_id=user_id,bot_response=response,user_message = user_message, user_timestamp=user_timestamp)
-            print(chat_message)
-            try:
-                db.session.add(chat_message)
-                db.session.commit()
-                logger.info("History Saved")
-            except Exception as e:
-                logger.exception(f"Could not save history: {e}")
+            save_chat_message(user_id, user_message, response, user_timestamp)
 
             return jsonify({"success": True, "response": response})
 
@@ -43,6 +37,58 @@ def chat():
     return render_template("chat.html", form=SupportForm(), categories=quick_link_categories)
 
 
+def save_chat_message(user_id, user_message, response, user_timestamp):
+    chat_message = ChatMessage(user_id=user_id,bot_response=response,user_message = user_message, user_timestamp=user_timestamp)
+    print(chat_message)
+    try:
+        db.session.add(chat_message)
+        db.session.commit()
+        logger.info("History Saved")
+    except Exception as e:
+        logger.exception(f"Could not save history: {e}")
+
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@chatbot_bp.route("/chat/stream", methods=["POST"])
+@login_required
+def chat_stream():
+    """
+    /chat as Server-Sent Events: "token" events carry the llm's markdown as it arrives,
+    "done" carries the whole html answer once it is saved to the history
+    """
+    user_timestamp = datetime.now()
+    user_id = current_user.id
+    user_message = (request.json or {}).get("message", "").strip()
+
+    def generate():
+        if not user_message:
+            yield sse_event("done", {"response": "Please enter a message."})
+            return
+        response = None
+        try:
+            for event in stream_response(user_message):
+                if "token" in event:
+                    yield sse_event("token", {"text": event["token"]})
+                else:
+                    response = event["html"]
+        except Exception as e:
+            logger.exception(f"Error in chat stream: {str(e)}")
+            yield sse_event("error", {"response": "An error occurred. Please try again."})
+            return
+        save_chat_message(user_id, user_message, response, user_timestamp)
+        yield sse_event("done", {"response": response})
+
+    # no-cache and X-Accel-Buffering keep proxies from holding the events back
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 @chatbot_bp.route("/get_chat_history")
 @login_required
 def get_chat_history():
@@ -1,10 +1,15 @@
+import argparse
+import hashlib
 import json
+import mmap
 import os
 import random
 import re
 import math
 from collections import Counter
 
+import numpy as np
+
 # Removed sklearn and pandas imports
 # from sklearn.metrics.pairwise import cosine_similarity
 # from sklearn.feature_extraction.text import TfidfVectorizer
@@ -14,17 +19,156 @@ from utils.logger import setup_logger
 
 logger = setup_logger("chatbot.tfid")
 
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+MODELS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "models")
+INDEX_PATH = os.path.join(MODELS_DIR, "tfid_index.bin")
+# Files whose content is hashed into the index artifact
+SOURCE_FILES = ("Structured_Chatbot_Data.csv", "responses.json", "intents.json")
+
+# Index artifact layout: magic, format version (uint32), header length (uint64),
+# JSON header, then the raw arrays, each starting on an 8 byte boundary
+INDEX_MAGIC = b"PTUTFIDX"
+INDEX_FORMAT_VERSION = 6
+INDEX_ARRAYS = (
+    "answer_ids",
+    "idf_values",
+    "doc_norms",
+    "doc_lengths",
+    "postings_indptr",
+    "postings_rows",
+    "postings_data",
+    "postings_counts",
+)
+
+# Scoring modes; both share the same postings index
+SCORERS = ("tfidf", "bm25")
+DEFAULT_SCORER = os.getenv("TFID_SCORER", "tfidf")
+
+# Scores are rounded to this many decimals before ranking, so rows that differ
+# only in the last ulp (depending on summation order) count as ties.
+TIE_DECIMALS = 12
+# Hashed features embed_query gives words outside the vocabulary
+UNKNOWN_TERM_BUCKETS = 1024
+
 class NoIntentFound(Exception):
     def __init__(self, *args):
         super().__init__(*args)
 
+
+def _trigrams(word):
+    """Character trigrams of a word padded like pg_trgm: two spaces before, one after."""
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _edit_distance(a, b):
+    """Optimal string alignment distance: Levenshtein plus adjacent transpositions."""
+    previous2, previous = None, list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                current[j] = min(current[j], previous2[j - 2] + 1)
+        previous2, previous = previous, current
+    return previous[len(b)]
+
+
+class TrigramIndex:
+    """
+    Character trigram index over a set of known terms, used to map misspelled query tokens
+    ("hostl", "admision") to a known term. A lookup only touches terms sharing a trigram with
+    the token, and only the shortlist sharing the most trigrams is scored by edit distance.
+    """
+
+    def __init__(self, term_frequencies, shortlist_size=20, min_similarity=0.7, min_length=4):
+        self.terms = list(term_frequencies)
+        self.frequencies = [term_frequencies[term] for term in self.terms]
+        self.shortlist_size = shortlist_size
+        self.min_similarity = min_similarity
+        self.min_length = min_length
+        # Trigram -> ids of the terms containing it
+        self.postings = {}
+        for term_id, term in enumerate(self.terms):
+            for trigram in _trigrams(term):
+                self.postings.setdefault(trigram, []).append(term_id)
+
+    def correct(self, token):
+        """
+        Closest known term to token, or None; the more frequent term wins equal similarity.
+        A term that is the token without its first letter is never taken: that letter usually
+        matters ("mtech" is not "tech").
+        """
+        if len(token) < self.min_length or not token.isalpha():
+            return None
+        shared = Counter()
+        for trigram in _trigrams(token):
+            shared.update(self.postings.get(trigram, ()))
+
+        best_term, best_key = None, None
+        for term_id, _ in shared.most_common(self.shortlist_size):
+            term = self.terms[term_id]
+            if term == token[1:]:
+                continue
+            similarity = 1 - _edit_distance(token, term) / max(len(token), len(term))
+            key = (similarity, self.frequencies[term_id])
+            if similarity >= self.min_similarity and (best_key is None or key > best_key):
+                best_term, best_key = term, key
+        return best_term
+
+    def correct_text(self, text, known_terms):
+        """text with every unknown token replaced by its correction, or None when nothing changed."""
+        tokens = re.findall(r'\w+', text)
+        corrected = [token if token in known_terms else (self.correct(token) or token) for token in tokens]
+        if corrected == tokens:
+            return None
+        return " ".join(corrected)
+
 class TFIDModel:
-    def __init__(self):
+    def __init__(self, index_path=INDEX_PATH, data_dir=DATA_DIR, scorer=DEFAULT_SCORER, k1=1.2, b=0.75, match_threshold=0.4):
+        if scorer not in SCORERS:
+            raise ValueError(f"Unknown scorer {scorer!r}, expected one of {SCORERS}")
         self.loaded = False
+        self.scorer = scorer
+        # BM25 term frequency saturation and document length normalization
+        self.k1 = k1
+        self.b = b
+        # Minimum score for find_best_match to accept a row
+        self.match_threshold = match_threshold
+        # Hash of the data files this model was built from, set once load_data succeeds
+        self.loaded_source_hash = None
+        self.data_dir = data_dir
+        self.index_path = index_path
         # These will store our manually calculated TF-IDF data
+        # Q/A pairs in columnar form: corpus[i] is answered by answers[answer_ids[i]]
         self.corpus = []
-        self.question_tfidf_vectors = []
+        self.answer_ids = np.zeros(0, dtype=np.int64)
+        self.answers = []
         self.idf_scores = {}
+        # Term -> column id of every (cleaned, see _corpus_tokens) term in the corpus
+        self.vocabulary = {}
+        # Precomputed L2 norm of every corpus row's TF-IDF vector
+        self.doc_norms = np.zeros(0)
+        # Number of tokens in every corpus row
+        self.doc_lengths = np.zeros(0, dtype=np.int64)
+        # Corpus TF-IDF matrix (rows = corpus rows, L2-normalized) in term-major form: the postings list of every term
+        self.postings_indptr = np.zeros(1, dtype=np.int64)
+        self.postings_rows = np.zeros(0, dtype=np.int64)
+        self.postings_data = np.zeros(0)
+        # Raw term count of every posting, and its BM25 weight for the configured k1 and b
+        self.postings_counts = np.zeros(0, dtype=np.int64)
+        self.bm25_idf = np.zeros(0)
+        self.bm25_avg_length = 0.0
+        self.bm25_data = np.zeros(0)
+        # Intent patterns compiled once: (intent, pattern token set) in intents.json order
+        self.intents = []
+        self.intent_patterns = []
+        # Token -> ids of the compiled patterns containing it
+        self.intent_token_index = {}
+        # Typo-tolerant fallbacks over the corpus vocabulary and the intent pattern tokens
+        self.term_trigrams = TrigramIndex({})
+        self.intent_trigrams = TrigramIndex({})
         # We don't need a vectorizer object anymore
         # self.vectorizer = None
 
@@ -39,14 +183,18 @@ class TFIDModel:
             return {}
         return {token: count / total_tokens for token, count in token_counts.items()}
 
+    def _corpus_tokens(self, text):
+        """Terms of a corpus row, cleaned like queries so "B.Tech" is one term, btech, on both sides."""
+        return re.findall(r'\w+', self.clean_text(text))
+
     def _compute_idf(self):
-        """Computes Inverse Document Frequency for the entire corpus."""
+        """Computes Inverse Document Frequency for the entire corpus, over the terms _build_index indexes."""
         num_documents = len(self.corpus)
         # Count how many documents contain each unique word
         doc_freq = Counter()
         all_words = set()
         for text in self.corpus:
-            unique_tokens_in_doc = set(re.findall(r'\w+', text))
+            unique_tokens_in_doc = set(self._corpus_tokens(text))
             doc_freq.update(unique_tokens_in_doc)
             all_words.update(unique_tokens_in_doc)
         
@@ -56,29 +204,295 @@ class TFIDModel:
         }
 
     def _compute_tfidf_vector(self, tf_scores):
-        """Computes the TF-IDF vector from TF scores and pre-computed IDF scores."""
-        tfidf_vector = {
-            word: tf_scores.get(word, 0) * self.idf_scores.get(word, 0)
-            for word in self.idf_scores.keys()
-        }
+        """Computes the sparse TF-IDF vector (only non-zero terms) from TF scores and pre-computed IDF scores."""
+        tfidf_vector = {}
+        for word, tf in tf_scores.items():
+            weight = tf * self.idf_scores.get(word, 0)
+            if weight:
+                tfidf_vector[word] = weight
         return tfidf_vector
 
-    def _cosine_similarity_manual(self, vec1, vec2):
-        """Calculates cosine similarity between two dictionary-based vectors."""
-        # Find common words
-        intersection = set(vec1.keys()) & set(vec2.keys())
-        
-        # Calculate dot product
-        dot_product = sum(vec1[word] * vec2[word] for word in intersection)
-        
-        # Calculate magnitudes
-        magnitude1 = math.sqrt(sum(val**2 for val in vec1.values()))
-        magnitude2 = math.sqrt(sum(val**2 for val in vec2.values()))
-        
-        if not magnitude1 or not magnitude2:
-            return 0.0
-        
-        return dot_product / (magnitude1 * magnitude2)
+    def _build_index(self):
+        """
+        Builds the L2-normalized TF-IDF matrix of the corpus row by row, then transposes it into term-major postings.
+        Every term of a row gets a posting, including terms whose TF-IDF weight is 0, so BM25 can share them.
+        """
+        self.vocabulary = {}
+        row_lengths = []
+        indices = []
+        data = []
+        counts = []
+        doc_lengths = []
+        for text in self.corpus:
+            tokens = self._corpus_tokens(text)
+            token_counts = Counter(tokens)
+            for word, count in token_counts.items():
+                indices.append(self.vocabulary.setdefault(word, len(self.vocabulary)))
+                counts.append(count)
+                data.append(count / len(tokens) * self.idf_scores.get(word, 0))
+            row_lengths.append(len(token_counts))
+            doc_lengths.append(len(tokens))
+
+        indices = np.asarray(indices, dtype=np.int64)
+        self.doc_lengths = np.asarray(doc_lengths, dtype=np.int64)
+        row_ids = np.repeat(np.arange(len(self.corpus), dtype=np.int64), np.asarray(row_lengths, dtype=np.int64))
+        raw_data = np.asarray(data, dtype=np.float64)
+        self.doc_norms = np.sqrt(np.bincount(row_ids, weights=raw_data**2, minlength=len(self.corpus)))
+        row_norms = self.doc_norms[row_ids]
+        data = np.divide(raw_data, row_norms, out=np.zeros_like(raw_data), where=row_norms > 0)
+
+        # Transpose into term-major order: a stable sort keeps each postings list sorted by row
+        order = np.argsort(indices, kind="stable")
+        self.postings_rows = row_ids[order]
+        self.postings_data = data[order]
+        self.postings_counts = np.asarray(counts, dtype=np.int64)[order]
+        term_counts = np.bincount(indices, minlength=len(self.vocabulary))
+        self.postings_indptr = np.concatenate(([0], np.cumsum(term_counts))).astype(np.int64)
+
+    def _build_bm25(self):
+        """Precomputes the BM25 weight of every posting, document length normalization included."""
+        num_rows = len(self.doc_lengths)
+        doc_freq = np.diff(self.postings_indptr)
+        self.bm25_idf = np.log((num_rows - doc_freq + 0.5) / (doc_freq + 0.5) + 1.0)
+        self.bm25_avg_length = float(self.doc_lengths.mean()) if num_rows and self.doc_lengths.any() else 1.0
+        length_norm = self.k1 * (1 - self.b + self.b * self.doc_lengths / self.bm25_avg_length)
+        counts = self.postings_counts.astype(np.float64)
+        term_ids = np.repeat(np.arange(len(doc_freq)), doc_freq)
+        self.bm25_data = self.bm25_idf[term_ids] * counts * (self.k1 + 1) / (counts + length_norm[self.postings_rows])
+
+    def _query_terms(self, query):
+        """
+        Weighted (term_id, weight) pairs of one query; terms outside the vocabulary are dropped.
+        TF-IDF weights are L2-normalized so the scores are cosine similarities. BM25 weights are
+        divided by the BM25 score of the query against itself, which keeps scores roughly in [0, 1].
+        """
+        query = self.clean_text(query)
+        if self.scorer == "bm25":
+            tokens = re.findall(r'\w+', query)
+            length_norm = self.k1 * (1 - self.b + self.b * len(tokens) / self.bm25_avg_length)
+            query_terms = [(self.vocabulary[word], count) for word, count in Counter(tokens).items() if word in self.vocabulary]
+            self_score = sum(
+                self.bm25_idf[term_id] * count * (self.k1 + 1) / (count + length_norm) for term_id, count in query_terms
+            )
+            return [(term_id, count / self_score) for term_id, count in query_terms]
+
+        query_vector = self._compute_tfidf_vector(self._compute_tf(query))
+        query_terms = [(self.vocabulary[word], weight) for word, weight in query_vector.items() if word in self.vocabulary]
+        norm = math.sqrt(sum(weight**2 for _, weight in query_terms))
+        return [(term_id, weight / norm) for term_id, weight in query_terms]
+
+    def _vectorize_queries(self, queries):
+        """
+        Builds the sparse query matrix in coordinate form.
+        Returns (query_rows, term_ids, weights).
+        """
+        query_rows, term_ids, weights = [], [], []
+        for query_row, query in enumerate(queries):
+            for term_id, weight in self._query_terms(query):
+                query_rows.append(query_row)
+                term_ids.append(term_id)
+                weights.append(weight)
+        return (
+            np.asarray(query_rows, dtype=np.int64),
+            np.asarray(term_ids, dtype=np.int64),
+            np.asarray(weights, dtype=np.float64),
+        )
+
+    def _score_batch(self, queries):
+        """
+        Scores the queries against the corpus as one sparse product
+        (queries x terms) . (terms x rows), walking only the postings of the query terms.
+        Returns (query_ids, rows, scores) of every (query, row) pair sharing a term,
+        sorted by query, then row; rows sharing no term with a query are never touched.
+        """
+        num_rows = len(self.doc_norms)
+        query_rows, term_ids, weights = self._vectorize_queries(queries)
+        starts = self.postings_indptr[term_ids]
+        lengths = self.postings_indptr[term_ids + 1] - starts
+        # Position in the postings arrays of every (query term, posting) pair
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+        cells = np.repeat(query_rows, lengths) * num_rows + self.postings_rows[offsets]
+        postings_values = self.bm25_data if self.scorer == "bm25" else self.postings_data
+        products = np.repeat(weights, lengths) * postings_values[offsets]
+        # Sum the products of every touched cell only, O(postings) instead of O(queries x rows)
+        touched, inverse = np.unique(cells, return_inverse=True)
+        scores = np.bincount(inverse, weights=products, minlength=len(touched))
+        return touched // num_rows, touched % num_rows, scores
+
+    def _top_k(self, rows, scores, k):
+        """Top-k (index, score) pairs among one query's candidate rows, best first, lowest index first on ties."""
+        if k <= 0:
+            return []
+        rounded = np.round(scores, TIE_DECIMALS)
+        candidates = np.flatnonzero(rounded > 0)
+        if k < len(candidates):
+            kth_score = np.partition(rounded[candidates], len(candidates) - k)[len(candidates) - k]
+            candidates = candidates[rounded[candidates] >= kth_score]
+        # lexsort sorts by the last key first: score descending, then row ascending
+        ranked = candidates[np.lexsort((rows[candidates], -rounded[candidates]))][:k]
+        return [(int(rows[i]), float(scores[i])) for i in ranked]
+
+    def _build_intent_index(self):
+        """Compiles the token set of every intent pattern and the token -> pattern ids index."""
+        self.intent_patterns = []
+        self.intent_token_index = {}
+        for intent in self.intents:
+            for pattern in intent.get('patterns', []):
+                pattern_tokens = frozenset(re.findall(r'\w+', pattern.lower()))
+                if not pattern_tokens:
+                    continue
+                pattern_id = len(self.intent_patterns)
+                self.intent_patterns.append((intent, pattern_tokens))
+                for token in pattern_tokens:
+                    self.intent_token_index.setdefault(token, []).append(pattern_id)
+        self.intent_trigrams = TrigramIndex({token: len(ids) for token, ids in self.intent_token_index.items()})
+
+    # --- Index artifact ---
+
+    def source_hash(self):
+        """SHA-256 over the name and content of every source data file."""
+        digest = hashlib.sha256()
+        for name in SOURCE_FILES:
+            path = os.path.join(self.data_dir, name)
+            if not os.path.exists(path):
+                continue
+            digest.update(name.encode("utf-8") + b"\0")
+            with open(path, "rb") as f:
+                digest.update(f.read())
+        return digest.hexdigest()
+
+    def _save_index(self, source_hash):
+        """Writes the compiled index to index_path; the file is replaced atomically."""
+        idf_terms = list(self.idf_scores)
+        arrays = {
+            "answer_ids": self.answer_ids,
+            "idf_values": np.asarray([self.idf_scores[word] for word in idf_terms], dtype=np.float64),
+            "doc_norms": self.doc_norms,
+            "doc_lengths": self.doc_lengths,
+            "postings_indptr": self.postings_indptr,
+            "postings_rows": self.postings_rows,
+            "postings_data": self.postings_data,
+            "postings_counts": self.postings_counts,
+        }
+        header = {
+            "source_hash": source_hash,
+            "corpus": self.corpus,
+            "answers": self.answers,
+            "idf_terms": idf_terms,
+            "vocabulary": list(self.vocabulary),
+            "arrays": {},
+        }
+        offset = 0
+        for name in INDEX_ARRAYS:
+            array = np.ascontiguousarray(arrays[name])
+            arrays[name] = array
+            header["arrays"][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            offset += -(-array.nbytes // 8) * 8
+        header_bytes = json.dumps(header).encode("utf-8")
+        prefix = INDEX_MAGIC + np.uint32(INDEX_FORMAT_VERSION).tobytes() + np.uint64(len(header_bytes)).tobytes()
+        header_bytes += b"\0" * (-(len(prefix) + len(header_bytes)) % 8)
+
+        os.makedirs(os.path.dirname(self.index_path), exist_ok=True)
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(prefix + header_bytes)
+            for name in INDEX_ARRAYS:
+                array = arrays[name]
+                f.write(array.tobytes())
+                f.write(b"\0" * (-array.nbytes % 8))
+        os.replace(tmp_path, self.index_path)
+        logger.info(f"Saved TF-IDF index artifact to {self.index_path}")
+
+    def _load_index(self, source_hash):
+        """
+        Memory-maps the index artifact into this model.
+        Returns False when it is missing, unreadable (e.g. truncated), has another format version
+        or was built from other data, so the caller rebuilds it.
+        """
+        if not os.path.exists(self.index_path):
+            return False
+        try:
+            return self._map_index(source_hash)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logger.warning(f"Ignoring unreadable TF-IDF index artifact {self.index_path}: {e!r}")
+            return False
+
+    def _map_index(self, source_hash):
+        """_load_index without the error handling; raises when the artifact is damaged."""
+        with open(self.index_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        prefix_len = len(INDEX_MAGIC) + 12
+        if buffer[:len(INDEX_MAGIC)] != INDEX_MAGIC:
+            logger.warning(f"Ignoring TF-IDF index artifact with unknown format: {self.index_path}")
+            return False
+        version = int(np.frombuffer(buffer, dtype=np.uint32, count=1, offset=len(INDEX_MAGIC))[0])
+        header_len = int(np.frombuffer(buffer, dtype=np.uint64, count=1, offset=len(INDEX_MAGIC) + 4)[0])
+        if version != INDEX_FORMAT_VERSION:
+            logger.info(f"TF-IDF index artifact has format version {version}, expected {INDEX_FORMAT_VERSION}")
+            return False
+        header = json.loads(bytes(buffer[prefix_len:prefix_len + header_len]))
+        if header["source_hash"] != source_hash:
+            logger.info("TF-IDF index artifact is stale, data files have changed")
+            return False
+
+        data_start = prefix_len + header_len + (-(prefix_len + header_len) % 8)
+        arrays = {}
+        for name in INDEX_ARRAYS:
+            spec = header["arrays"][name]
+            count = int(np.prod(spec["shape"]))
+            if count:
+                arrays[name] = np.frombuffer(buffer, dtype=spec["dtype"], count=count, offset=data_start + spec["offset"])
+            else:
+                arrays[name] = np.zeros(0, dtype=spec["dtype"])
+
+        self.corpus = header["corpus"]
+        self.answers = header["answers"]
+        self.answer_ids = arrays["answer_ids"]
+        self.idf_scores = dict(zip(header["idf_terms"], arrays["idf_values"].tolist()))
+        self.vocabulary = {word: term_id for term_id, word in enumerate(header["vocabulary"])}
+        self.doc_norms = arrays["doc_norms"]
+        self.doc_lengths = arrays["doc_lengths"]
+        self.postings_indptr = arrays["postings_indptr"]
+        self.postings_rows = arrays["postings_rows"]
+        self.postings_data = arrays["postings_data"]
+        self.postings_counts = arrays["postings_counts"]
+        return True
+
+    def _load_corpus(self, csv_path):
+        # --- Replacing pandas CSV loading ---
+        import csv # Standard library import
+        with open(csv_path, mode='r', encoding='utf-8') as infile:
+            reader = csv.reader(infile)
+            header = next(reader) # Skip header row
+            # Find the index of the columns we need
+            pattern_index = header.index('User Query (Pattern)')
+            answer_index = header.index('Bot Response')
+
+            # Store patterns in our corpus list and every distinct answer once
+            self.corpus = []
+            answer_lookup = {}
+            answer_ids = []
+            for row in reader:
+                if not row or not row[pattern_index]:
+                    continue
+                answer = row[answer_index].strip() if len(row) > answer_index else ""
+                self.corpus.append(row[pattern_index].strip())
+                answer_ids.append(answer_lookup.setdefault(answer, len(answer_lookup)))
+            self.answers = list(answer_lookup)
+            self.answer_ids = np.asarray(answer_ids, dtype=np.int64)
+
+        # --- Replacing sklearn TF-IDF fitting ---
+        # 1. Compute IDF for the entire corpus
+        self._compute_idf()
+        # 2. Index the TF-IDF vector of each question in the corpus
+        self._build_index()
+
+    def build_index_artifact(self):
+        """Compiles the index from the data files and writes it to index_path."""
+        csv_path = os.path.join(self.data_dir, 'Structured_Chatbot_Data.csv')
+        self._load_corpus(csv_path)
+        self._save_index(self.source_hash())
+        logger.info(f"Built TF-IDF index: {len(self.corpus)} rows, {len(self.vocabulary)} terms, {len(self.postings_rows)} postings")
 
     # --- Modified Core Class Methods ---
 
@@ -86,30 +500,22 @@ class TFIDModel:
         if self.loaded:
             return
         try:
-            # --- Replacing pandas CSV loading ---
-            self.data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+            source_hash = self.source_hash()
             csv_path = os.path.join(self.data_dir, 'Structured_Chatbot_Data.csv')
             if os.path.exists(csv_path):
-                import csv # Standard library import
-                with open(csv_path, mode='r', encoding='utf-8') as infile:
-                    reader = csv.reader(infile)
-                    header = next(reader) # Skip header row
-                    # Find the index of the column we need
-                    pattern_index = header.index('User Query (Pattern)')
-                    
-                    # Store patterns directly in our corpus list
-                    self.corpus = [row[pattern_index].strip() for row in reader if row and row[pattern_index]]
-                
-                # --- Replacing sklearn TF-IDF fitting ---
-                # 1. Compute IDF for the entire corpus
-                self._compute_idf()
-                # 2. Compute TF-IDF vector for each question in the corpus
-                for text in self.corpus:
-                    tf_scores = self._compute_tf(text.lower())
-                    tfidf_vector = self._compute_tfidf_vector(tf_scores)
-                    self.question_tfidf_vectors.append(tfidf_vector)
-
-                logger.info(f"Successfully loaded and processed CSV file with {len(self.corpus)} rows")
+                if self._load_index(source_hash):
+                    logger.info(f"Loaded TF-IDF index artifact with {len(self.corpus)} rows")
+                else:
+                    self._load_corpus(csv_path)
+                    logger.info(f"Successfully loaded and processed CSV file with {len(self.corpus)} rows")
+                    try:
+                        self._save_index(source_hash)
+                    except OSError as e:
+                        logger.warning(f"Could not save TF-IDF index artifact: {e}")
+                if self.scorer == "bm25":
+                    self._build_bm25()
+                doc_freq = np.diff(self.postings_indptr).tolist()
+                self.term_trigrams = TrigramIndex({word: doc_freq[term_id] for word, term_id in self.vocabulary.items()})
             else:
                 logger.error(f"Error: CSV file not found at {csv_path}")
 
@@ -125,8 +531,10 @@ class TFIDModel:
                 with open(intents_path, 'r', encoding='utf-8') as f:
                     intents_data = json.load(f)
                     self.intents = intents_data.get('intents', [])
+                    self._build_intent_index()
                     logger.info("Successfully loaded intents JSON")
-                    
+
+            self.loaded_source_hash = source_hash
         except Exception as e:
             logger.exception(f"Error loading data files: {str(e)}")
         self.loaded = True
@@ -137,56 +545,126 @@ class TFIDModel:
         text = re.sub(r'[^\w\s?]', '', text)
         return text
 
-    def find_best_match(self, user_message):
+    def find_best_matches(self, queries, k=1, batch_size=256):
+        """
+        Scores a batch of queries against the corpus.
+        Returns, for every query, up to k (index, score) pairs sorted best first;
+        rows sharing no term with a query are never returned.
+        """
         self.load_data()
-        if not self.question_tfidf_vectors:
+        queries = list(queries)
+        if not len(self.doc_norms):
             logger.info("TF-IDF vectors not initialized")
-            return -1
-        
-        # Clean user message
-        user_message = self.clean_text(user_message)
-        
-        # --- Replacing sklearn vectorizing and similarity calculation ---
-        # 1. Compute TF for the user's message
-        user_tf = self._compute_tf(user_message)
-        # 2. Compute TF-IDF vector for the user's message using existing IDF scores
-        user_vector = self._compute_tfidf_vector(user_tf)
-        
-        # 3. Calculate similarities by looping and comparing
-        similarities = [self._cosine_similarity_manual(user_vector, q_vec) for q_vec in self.question_tfidf_vectors]
-        
-        best_match_idx = -1
-        best_similarity = -1.0
-        if similarities:
-            best_match_idx = max(range(len(similarities)), key=similarities.__getitem__)
-            best_similarity = similarities[best_match_idx]
-        
+            return [[] for _ in queries]
+
+        batch_size = max(1, batch_size)
+        results = []
+        for start in range(0, len(queries), batch_size):
+            batch = queries[start:start + batch_size]
+            query_ids, rows, scores = self._score_batch(batch)
+            bounds = np.searchsorted(query_ids, np.arange(len(batch) + 1))
+            results.extend(
+                self._top_k(rows[lo:hi], scores[lo:hi], k) for lo, hi in zip(bounds[:-1], bounds[1:])
+            )
+        return results
+
+    def embed_query(self, query):
+        """
+        Dense L2-normalized TF-IDF vector of the query: the corpus vocabulary, then
+        UNKNOWN_TERM_BUCKETS hashed features for words outside it. Every word gets a weight,
+        so queries differing only in words the TF-IDF weights miss never share a vector.
+        """
+        self.load_data()
+        vector = np.zeros(len(self.vocabulary) + UNKNOWN_TERM_BUCKETS, dtype=np.float32)
+        num_documents = max(len(self.corpus), 1)
+        for word, tf in self._compute_tf(self.clean_text(query)).items():
+            if word in self.vocabulary:
+                vector[self.vocabulary[word]] = tf * max(self.idf_scores.get(word, 0.0), 0.0)
+            else:
+                # an unknown word weighs as much as a term found in no document
+                bucket = int.from_bytes(hashlib.blake2b(word.encode(), digest_size=8).digest(), "little")
+                vector[len(self.vocabulary) + bucket % UNKNOWN_TERM_BUCKETS] += tf * math.log(num_documents)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def known_responses(self):
+        """Every text get_response can return: the corpus answers and the intent responses."""
+        self.load_data()
+        return set(self.answers) | {response for intent in self.intents for response in intent.get('responses', [])}
+
+    def get_candidates(self, query, k=3):
+        """Top-k corpus matches for the query as (pattern, answer, score) tuples, best first."""
+        return [
+            (self.corpus[idx], self.answers[self.answer_ids[idx]], score)
+            for idx, score in self.find_best_matches([query], k=k)[0]
+        ]
+
+    def find_best_match(self, user_message):
+        return self._best_row(user_message)[0]
+
+    def _best_row(self, user_message):
+        """(corpus index, score) of the best TF-IDF match above match_threshold, (-1, 0.0) without one."""
+        matches = self.find_best_matches([user_message], k=1)[0]
+        best_match_idx, best_similarity = matches[0] if matches else (-1, 0.0)
+
         logger.info(f"Best similarity score: {best_similarity:.3f}")
         
-        if best_similarity > 0.4:
-            return best_match_idx
+        if best_similarity > self.match_threshold:
+            return best_match_idx, best_similarity
+
+        # Fall back to the message with misspelled words replaced by known terms
+        corrected_message = self.term_trigrams.correct_text(self.clean_text(user_message), self.vocabulary)
+        if corrected_message:
+            matches = self.find_best_matches([corrected_message], k=1)[0]
+            if matches and matches[0][1] > self.match_threshold:
+                logger.info(f"Best similarity score for corrected message '{corrected_message}': {matches[0][1]:.3f}")
+                return matches[0]
         
-        return -1
+        return -1, 0.0
 
-    def get_intent_response(self, user_message):
-        # This method doesn't use pandas or sklearn, so it needs no changes.
-        self.load_data()
-        user_message = user_message.lower()
-        user_tokens = set(re.findall(r'\w+', user_message))
+    def _match_intent(self, user_tokens):
+        """
+        Best (intent, score, message share) for the token set, (None, 0, 0) when no pattern
+        reaches the 0.5 threshold. The score is the share of the pattern's tokens in the message
+        and picks the pattern; the message share is the share of the message's tokens in it.
+        """
         best_match = None
         best_score = 0
-        
-        for intent in self.intents:
-            for pattern in intent.get('patterns', []):
-                pattern_tokens = set(re.findall(r'\w+', pattern.lower()))
-                if not pattern_tokens:
-                    continue
-                common_tokens = user_tokens & pattern_tokens
-                score = len(common_tokens) / len(pattern_tokens)
-                
-                if score > best_score and score >= 0.5:
-                    best_score = score
-                    best_match = intent
+        best_share = 0
+
+        # Count shared tokens only for patterns that contain at least one query token
+        common_counts = Counter()
+        for token in user_tokens:
+            common_counts.update(self.intent_token_index.get(token, ()))
+
+        # Visit candidates in intents.json order so the first best pattern still wins ties
+        for pattern_id in sorted(common_counts):
+            intent, pattern_tokens = self.intent_patterns[pattern_id]
+            score = common_counts[pattern_id] / len(pattern_tokens)
+            
+            if score > best_score and score >= 0.5:
+                best_score = score
+                best_match = intent
+                best_share = common_counts[pattern_id] / len(user_tokens)
+        return best_match, best_score, best_share
+
+    def _best_intent(self, user_message):
+        """(intent, score, message share) of the best intent pattern match, (None, 0, 0) without one."""
+        self.load_data()
+        user_message = user_message.lower()
+        best_match, best_score, best_share = self._match_intent(set(re.findall(r'\w+', user_message)))
+
+        if not best_match:
+            # Fall back to the message with misspelled words replaced by pattern tokens
+            corrected_message = self.intent_trigrams.correct_text(user_message, self.intent_token_index)
+            if corrected_message:
+                best_match, best_score, best_share = self._match_intent(set(corrected_message.split()))
+                if best_match:
+                    logger.info(f"Matched intent for corrected message '{corrected_message}'")
+        return best_match, best_score, best_share
+
+    def get_intent_response(self, user_message):
+        best_match, best_score, _ = self._best_intent(user_message)
         
         if best_match:
             logger.info(f"Found intent match with score: {best_score:.3f}")
@@ -195,18 +673,68 @@ class TFIDModel:
         logger.info("No intent match found")
         raise NoIntentFound("No intent match found")
 
+    def query_coverage(self, query):
+        """
+        Share of the query's IDF weight carried by terms in the vocabulary, in [0, 1];
+        an unknown term weighs as much as a term found in no document.
+        """
+        self.load_data()
+        tokens = re.findall(r'\w+', self.clean_text(query))
+        if not tokens:
+            return 0.0
+        num_documents = max(len(self.corpus), 1)
+        known = unknown = 0.0
+        for token in tokens:
+            if token in self.vocabulary:
+                known += max(self.idf_scores.get(token, 0.0), 0.0)
+            else:
+                unknown += math.log(num_documents)
+        return known / (known + unknown) if known + unknown else 1.0
+
+    def local_matches(self, user_message):
+        """
+        Best local answer of each kind with a confidence score, as
+        {"intent": (response, score), "tfidf": (response, score)}; kinds without a match are left out.
+        The intent is picked as in get_intent_response; its score is the smaller of the share of the
+        pattern's tokens in the message and the share of the message's tokens in the pattern, so a
+        short pattern inside a longer question ("hi, what is ...") scores low. TF-IDF scores are
+        scaled by query_coverage, so words the corpus does not know lower the confidence.
+        """
+        matches = {}
+        best_match, best_score, best_share = self._best_intent(user_message)
+        if best_match:
+            matches["intent"] = (random.choice(best_match.get('responses', [])), min(best_score, best_share))
+        match_index, score = self._best_row(user_message)
+        if match_index != -1:
+            matches["tfidf"] = (self.answers[self.answer_ids[match_index]], score * self.query_coverage(user_message))
+        return matches
+
     def get_response(self, user_message):
-        # This method also needs no changes.
         try:
             response = self.get_intent_response(user_message)
             return response
         except NoIntentFound:
             match_index = self.find_best_match(user_message)
             if match_index != -1:
-                # Assuming you need to get the response from the original data
-                # We need to re-read the CSV to get the response, which is inefficient
-                # A better way would be to load questions and answers together.
-                # For now, let's just confirm it works. A proper implementation would
-                # load the response column in load_data() as well.
-                return f"Found a match for: {self.corpus[match_index]}"
-        return "I'm sorry, I didn't understand that."
\ No newline at end of file
+                return self.answers[self.answer_ids[match_index]]
+        return "I'm sorry, I didn't understand that."
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="PTU TF-IDF index")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_build = sub.add_parser("build", help="Compile the TF-IDF index artifact")
+    p_build.add_argument("--output", default=INDEX_PATH)
+
+    args = parser.parse_args(argv)
+
+    if args.cmd == "build":
+        TFIDModel(index_path=args.output).build_index_artifact()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,14 +2,47 @@ from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 import os
 import smtplib
+import threading
 
 from flask_login import current_user
-from app.chatbot.groq_model import answer
+import markdown
+from app.chatbot.cache import ResponseCache, SemanticCache
+from app.chatbot.groq_model import answer_with_status, stream_answer
+from app.chatbot.hybrid import HybridRetriever
+from app.chatbot.router import ConfidenceRouter
 from app.chatbot.tfid import TFIDModel
 from utils.logger import setup_logger
 
 logger = setup_logger("chatbot.utils")
 tf_id_model = TFIDModel()
+_reload_lock = threading.Lock()
+response_cache = ResponseCache(
+    max_size=int(os.getenv("RESPONSE_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", "3600")),
+)
+# "tfidf" answers from the TF-IDF model alone, "hybrid" fuses it with embedding search
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "tfidf")
+
+
+def embed_query(query: str):
+    """
+    query vector for the semantic cache: sentence embeddings in hybrid mode, where the
+    embedder is loaded anyway, the tf-idf vector otherwise
+    """
+    if RETRIEVAL_MODE == "hybrid":
+        from app.chatbot import rag_model
+
+        return rag_model.registry.embedding_cache().encode([query], rag_model.registry.embedder, persist=False)[0]
+    return tf_id_model.embed_query(query)
+
+
+semantic_cache = SemanticCache(
+    embed_query,
+    threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+    max_size=int(os.getenv("SEMANTIC_CACHE_SIZE", "512")),
+    ttl=float(os.getenv("SEMANTIC_CACHE_TTL", "3600")),
+)
+router = ConfidenceRouter()
 
 # def get_response(user_message: str) -> str:
 #     """
@@ -22,12 +55,166 @@ tf_id_model = TFIDModel()
 #         return answer(user_message)
 
 
+def normalize_query(user_message: str) -> str:
+    """
+    cache key for a message: tf-idf cleaning, without question marks and repeated whitespace
+    """
+    return " ".join(tf_id_model.clean_text(user_message).replace("?", " ").split())
+
+
+def lexical_search(query: str, n: int):
+    return [(answer_text, score) for _, answer_text, score in tf_id_model.get_candidates(query, k=n)]
+
+
+def semantic_search(query: str, n: int):
+    # imported on first use: the embedding stack is only needed in hybrid mode
+    from app.chatbot import rag_model
+
+    return rag_model.search_many([query], k=n)[0]
+
+
+hybrid_retriever = HybridRetriever(lexical_search, semantic_search)
+
+
+def retrieve_intent(user_message: str, local_matches=None) -> str:
+    """
+    the knowledge base answer passed to the llm along with the query;
+    local_matches is the tf_id_model.local_matches result when the caller already has it
+    """
+    if local_matches is None:
+        local_matches = tf_id_model.local_matches(user_message)
+    if "intent" in local_matches:
+        return local_matches["intent"][0]
+    if RETRIEVAL_MODE != "hybrid":
+        return local_matches["tfidf"][0] if "tfidf" in local_matches else "I'm sorry, I didn't understand that."
+    hits = hybrid_retriever.retrieve(user_message, k=1)
+    return hits[0]["answer"] if hits else "I'm sorry, I didn't understand that."
+
+
 def get_response(user_message: str) -> str:
     """
-    returns the response from the llm for the given query about ptu
+    returns the response for the given query about ptu: the local answer when the
+    router is confident in it, the llm's answer otherwise
+    """
+    cache_key = normalize_query(user_message)
+    response = response_cache.get(cache_key)
+    if response is not None:
+        router.record("cache")
+        return response
+
+    local_matches = tf_id_model.local_matches(user_message)
+    # the llm decision is recorded once the semantic cache has been checked
+    local_answer = router.route(local_matches, record_llm=False)
+    if local_answer is not None:
+        # not cached: it is as cheap as a lookup, and intents keep their varied responses
+        return markdown.markdown(local_answer)
+
+    # paraphrases of a recently answered query reuse its answer
+    query_vector = semantic_cache.embed(cache_key)
+    response = semantic_cache.get(query_vector)
+    if response is not None:
+        router.record("semantic_cache", router.scores(local_matches))
+        response_cache.set(cache_key, response)
+        return response
+
+    router.record("llm", router.scores(local_matches))
+    intent = retrieve_intent(user_message, local_matches)
+    response, degraded = answer_with_status(user_message, intent)
+    # a fallback answer is not cached, so the llm answers again once it is back
+    if not degraded:
+        response_cache.set(cache_key, response)
+        semantic_cache.set(query_vector, response, intent=intent)
+    return response
+
+
+def stream_response(user_message: str):
+    """
+    get_response as a stream of events: {"token": markdown text} for every piece of the
+    llm's answer as it arrives, then {"html": the whole answer}; cached and local answers
+    come as the final event alone
     """
-    intent = tf_id_model.get_response(user_message)
-    return answer(user_message, intent)
+    cache_key = normalize_query(user_message)
+    response = response_cache.get(cache_key)
+    if response is not None:
+        router.record("cache")
+        yield {"html": response}
+        return
+
+    local_matches = tf_id_model.local_matches(user_message)
+    # the llm decision is recorded once the semantic cache has been checked
+    local_answer = router.route(local_matches, record_llm=False)
+    if local_answer is not None:
+        yield {"html": markdown.markdown(local_answer)}
+        return
+
+    query_vector = semantic_cache.embed(cache_key)
+    response = semantic_cache.get(query_vector)
+    if response is not None:
+        router.record("semantic_cache", router.scores(local_matches))
+        response_cache.set(cache_key, response)
+        yield {"html": response}
+        return
+
+    router.record("llm", router.scores(local_matches))
+    intent = retrieve_intent(user_message, local_matches)
+    pieces, degraded = [], False
+    for content, piece_degraded in stream_answer(user_message, intent):
+        degraded = degraded or piece_degraded
+        if content:
+            pieces.append(content)
+            yield {"token": content}
+    response = markdown.markdown("".join(pieces))
+    if not degraded:
+        response_cache.set(cache_key, response)
+        semantic_cache.set(query_vector, response, intent=intent)
+    yield {"html": response}
+
+
+def reload_knowledge_base(force: bool = False) -> bool:
+    """
+    rebuilds the tf-idf and intent indexes when the data files have changed and swaps
+    the new model in; requests already running keep using the model they started with.
+    returns True when a new model was swapped in
+    """
+    global tf_id_model
+    if not _reload_lock.acquire(blocking=False):
+        logger.info("Knowledge base reload already in progress")
+        return False
+    try:
+        current_model = tf_id_model
+        # a model that was never loaded will read the current files on its first request anyway
+        if not force and (not current_model.loaded or current_model.loaded_source_hash == current_model.source_hash()):
+            return False
+
+        new_model = TFIDModel(
+            index_path=current_model.index_path,
+            data_dir=current_model.data_dir,
+            scorer=current_model.scorer,
+            k1=current_model.k1,
+            b=current_model.b,
+            match_threshold=current_model.match_threshold,
+        )
+        new_model.load_data()
+        if new_model.loaded_source_hash is None:
+            logger.error("Knowledge base reload failed, keeping the current model")
+            return False
+
+        tf_id_model = new_model
+        # cached answers were built from the old data
+        response_cache.clear()
+        if RETRIEVAL_MODE == "hybrid":
+            # sentence embeddings do not depend on the data: only drop answers whose intent changed
+            known_responses = new_model.known_responses()
+            stale = [intent for intent in semantic_cache.intents() if intent not in known_responses]
+            dropped = sum(semantic_cache.invalidate_intent(intent) for intent in stale)
+            logger.info(f"Semantic cache dropped {dropped} answers of {len(stale)} changed intents")
+        else:
+            # tf-idf query vectors live in the vocabulary of the old model
+            semantic_cache.clear()
+        logger.info(f"Knowledge base reloaded with {len(new_model.corpus)} rows")
+        return True
+    finally:
+        _reload_lock.release()
 
 
 def send_email_to_support(email_subject: str, email_body: str, bcc: str = None):
@@ -0,0 +1,262 @@
+# app/chatbot/vector_index.py
+from __future__ import annotations
+import json
+import os
+import uuid
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+
+HERE = Path(__file__).resolve().parent
+VECTOR_INDEX_DIR = HERE / "models" / "vector_index"
+META_FILE = "meta.json"
+INDEX_FORMAT_VERSION = 3
+
+# Rows scored per matrix product when assigning vectors to IVF lists, and rows
+# normalized/quantized per step when writing a build
+ASSIGN_CHUNK_ROWS = 65536
+# Rows sampled to train the IVF centroids of a large build
+KMEANS_TRAIN_ROWS = 65536
+# int8 rows widened to float32 per matrix product when searching a quantized index
+SCORE_CHUNK_ROWS = 16384
+DTYPES = ("float32", "int8")
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms > 0, norms, 1)
+
+
+def quantize_rows(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric int8 codes with one float32 scale per row: row ~= codes * scale.
+    """
+    scales = np.abs(vectors).max(axis=1) / 127
+    scales = np.where(scales > 0, scales, 1).astype(np.float32)
+    codes = np.clip(np.rint(vectors / scales[:, None]), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def assign_lists(vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+    """Id of the closest (highest cosine) centroid of every row."""
+    assignment = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), ASSIGN_CHUNK_ROWS):
+        chunk = vectors[start:start + ASSIGN_CHUNK_ROWS]
+        assignment[start:start + len(chunk)] = np.argmax(chunk @ centroids.T, axis=1)
+    return assignment
+
+
+def spherical_kmeans(vectors: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Unit-length centroids of nlist clusters of the (normalized) rows."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = assign_lists(vectors, centroids)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        counts = np.bincount(assignment, minlength=nlist)
+        # empty clusters keep their previous centroid
+        centroids = np.where(counts[:, None] > 0, normalize_rows(sums), centroids)
+    return centroids
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+class NumpyVectorIndex:
+    """
+    Cosine search over an L2-normalized embedding matrix that is memory-mapped read-only,
+    so every worker process shares one copy of it through the page cache.
+
+    Flat mode scores every row exactly. IVF mode (nlist > 0 at build time) clusters the
+    rows with spherical k-means, stores each cluster contiguously and only scores the
+    rows of the nprobe clusters closest to the query.
+
+    An int8 build also stores every row as int8 codes plus a float32 scale, a quarter of
+    the float32 size, and searches those. The float32 matrix stays on disk: with
+    rescore > 0 the best `rescore` candidates are scored again against it, which only
+    pages in those rows.
+
+    Every row carries a ref, an opaque string returned with its hits (the answer id of
+    a question, the span of a passage); callers resolve it themselves.
+
+    Files in index_dir: meta.json, which names the .npy files of the current build.
+    meta.json is replaced atomically, so readers never see a half written build.
+    """
+
+    def __init__(self, index_dir: Path = VECTOR_INDEX_DIR, nprobe: int = 8, rescore: int = 0):
+        self.index_dir = Path(index_dir)
+        self.nprobe = nprobe
+        self.rescore = rescore
+        meta = json.loads((self.index_dir / META_FILE).read_text(encoding="utf-8"))
+        if meta.get("version") != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported vector index version {meta.get('version')} in {self.index_dir}")
+        self.meta = meta
+        self.ids: List[str] = meta["ids"]
+        self.refs: List[str] = meta["refs"]
+        self.embeddings = np.load(self.index_dir / meta["embeddings"], mmap_mode="r")
+        self.centroids = np.load(self.index_dir / meta["centroids"]) if meta["centroids"] else None
+        self.codes = self.scales = None
+        if meta.get("codes"):
+            self.codes = np.load(self.index_dir / meta["codes"], mmap_mode="r")
+            self.scales = np.load(self.index_dir / meta["scales"])
+        self.list_offsets = np.asarray(meta["list_offsets"], dtype=np.int64)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @staticmethod
+    def read_meta(index_dir: Path = VECTOR_INDEX_DIR) -> dict | None:
+        path = Path(index_dir) / META_FILE
+        if not path.exists():
+            return None
+        return json.loads(path.read_text(encoding="utf-8"))
+
+    @staticmethod
+    def build(
+        ids: List[str],
+        refs: List[str],
+        content_hashes: List[str],
+        embeddings: np.ndarray,
+        embedder_name: str,
+        index_dir: Path = VECTOR_INDEX_DIR,
+        nlist: int = 0,
+        dtype: str = "float32",
+    ) -> None:
+        if dtype not in DTYPES:
+            raise ValueError(f"Unknown vector index dtype: {dtype}")
+        index_dir = Path(index_dir)
+        index_dir.mkdir(parents=True, exist_ok=True)
+        num_rows, dim = embeddings.shape
+        build_id = uuid.uuid4().hex[:12]
+
+        # embeddings may be a memory-mapped file: it is only read ASSIGN_CHUNK_ROWS rows at a time
+        centroids_file = None
+        order = None
+        list_offsets = [0, num_rows]
+        if min(nlist, num_rows) > 0:
+            train_rows = np.arange(num_rows)
+            if num_rows > KMEANS_TRAIN_ROWS:
+                train_rows = np.sort(np.random.default_rng(0).choice(num_rows, KMEANS_TRAIN_ROWS, replace=False))
+            centroids = spherical_kmeans(normalize_rows(embeddings[train_rows]), min(nlist, num_rows))
+            assignment = np.concatenate([
+                assign_lists(normalize_rows(embeddings[start:start + ASSIGN_CHUNK_ROWS]), centroids)
+                for start in range(0, num_rows, ASSIGN_CHUNK_ROWS)
+            ])
+            # store every list contiguously
+            order = np.argsort(assignment, kind="stable")
+            ids = [ids[i] for i in order]
+            refs = [refs[i] for i in order]
+            content_hashes = [content_hashes[i] for i in order]
+            list_offsets = np.concatenate(([0], np.cumsum(np.bincount(assignment, minlength=len(centroids))))).tolist()
+            centroids_file = f"centroids-{build_id}.npy"
+            np.save(index_dir / centroids_file, centroids)
+
+        embeddings_file = f"embeddings-{build_id}.npy"
+        vectors = np.lib.format.open_memmap(index_dir / embeddings_file, mode="w+", dtype=np.float32, shape=(num_rows, dim))
+        codes_file = scales_file = None
+        if dtype == "int8":
+            codes_file, scales_file = f"codes-{build_id}.npy", f"scales-{build_id}.npy"
+            codes = np.lib.format.open_memmap(index_dir / codes_file, mode="w+", dtype=np.int8, shape=(num_rows, dim))
+            scales = np.empty(num_rows, dtype=np.float32)
+        for start in range(0, num_rows, ASSIGN_CHUNK_ROWS):
+            rows = slice(start, start + ASSIGN_CHUNK_ROWS)
+            chunk = normalize_rows(embeddings[rows] if order is None else embeddings[np.sort(order[rows])])
+            if order is not None:
+                # rows were read in file order, put them back in list order
+                chunk = chunk[np.argsort(np.argsort(order[rows]))]
+            vectors[rows] = chunk
+            if dtype == "int8":
+                codes[rows], scales[rows] = quantize_rows(chunk)
+        vectors.flush()
+        del vectors
+        if dtype == "int8":
+            codes.flush()
+            del codes
+            np.save(index_dir / scales_file, scales)
+
+        previous = NumpyVectorIndex.read_meta(index_dir)
+        meta = {
+            "version": INDEX_FORMAT_VERSION,
+            "embedder": embedder_name,
+            "embeddings": embeddings_file,
+            "centroids": centroids_file,
+            "codes": codes_file,
+            "scales": scales_file,
+            "nlist": nlist,
+            "dtype": dtype,
+            "list_offsets": list_offsets,
+            "ids": ids,
+            "refs": refs,
+            "content_hashes": content_hashes,
+        }
+        tmp_path = index_dir / f"{META_FILE}.{os.getpid()}.tmp"
+        tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+        os.replace(tmp_path, index_dir / META_FILE)
+
+        # processes still mapping the old files keep them alive until they reload
+        if previous:
+            for key in ("embeddings", "centroids", "codes", "scales"):
+                name = previous.get(key)
+                if name:
+                    (index_dir / name).unlink(missing_ok=True)
+
+    def _candidate_rows(self, query: np.ndarray) -> np.ndarray | None:
+        """Rows of the nprobe closest lists, or None to scan every row."""
+        if self.centroids is None or self.nprobe >= len(self.centroids):
+            return None
+        probe = top_k(self.centroids @ query, self.nprobe)
+        return np.concatenate([np.arange(self.list_offsets[c], self.list_offsets[c + 1]) for c in probe])
+
+    def _scores(self, queries: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        """Scores (queries x rows) of the normalized queries against all rows or the given rows."""
+        if self.codes is None:
+            matrix = self.embeddings if rows is None else self.embeddings[rows]
+            return queries @ matrix.T
+
+        n_rows = len(self.codes) if rows is None else len(rows)
+        scores = np.empty((len(queries), n_rows), dtype=np.float32)
+        for start in range(0, n_rows, SCORE_CHUNK_ROWS):
+            chunk = slice(start, start + SCORE_CHUNK_ROWS)
+            chunk_rows = chunk if rows is None else rows[chunk]
+            # NumPy has no int8 GEMM, so widen one chunk at a time
+            scores[:, chunk] = (queries @ self.codes[chunk_rows].astype(np.float32).T) * self.scales[chunk_rows]
+        return scores
+
+    def _best(self, query: np.ndarray, rows: np.ndarray | None, scores: np.ndarray, k: int) -> List[Tuple[str, float]]:
+        """Top-k hits from the scores of `rows` (None = every row), rescored in float32 when quantized."""
+        n_candidates = max(k, self.rescore) if self.codes is not None and self.rescore > 0 else k
+        best = top_k(scores, n_candidates)
+        best_rows = best if rows is None else rows[best]
+        best_scores = scores[best]
+        if n_candidates > k:
+            best_rows = np.sort(best_rows)  # ascending reads from the mapped file
+            best_scores = self.embeddings[best_rows] @ query
+            order = top_k(best_scores, k)
+            best_rows, best_scores = best_rows[order], best_scores[order]
+        return [(self.refs[row], float(score)) for row, score in zip(best_rows, best_scores)]
+
+    def search(self, queries: np.ndarray, k: int = 3) -> List[List[Tuple[str, float]]]:
+        """(ref, cosine similarity) of the top-k rows for every query, best first."""
+        queries = normalize_rows(np.atleast_2d(queries))
+        if not len(self.ids) or k <= 0:
+            return [[] for _ in queries]
+
+        if self.centroids is None:
+            all_scores = self._scores(queries)
+            return [self._best(query, None, scores, k) for query, scores in zip(queries, all_scores)]
+
+        results = []
+        for query in queries:
+            rows = self._candidate_rows(query)
+            scores = self._scores(query[None, :], rows)[0]
+            results.append(self._best(query, rows, scores, k))
+        return results
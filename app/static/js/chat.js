@@ -59,8 +59,8 @@ document.addEventListener("DOMContentLoaded", function () {
 				typingIndicator.classList.add("active");
 			}
 
-			// Send message to server
-			fetch("/chat", {
+			// Stream the answer from the server
+			fetch("/chat/stream", {
 				method: "POST",
 				headers: {
 					"Content-Type": "application/json",
@@ -68,15 +68,49 @@ document.addEventListener("DOMContentLoaded", function () {
 				},
 				body: JSON.stringify({ message: message }),
 			})
-				.then((response) => response.json())
-				.then((data) => {
-					// Hide typing indicator
-					if (typingIndicator) {
-						typingIndicator.classList.remove("active");
+				.then((response) => {
+					if (!response.ok) {
+						throw new Error(`Chat stream failed with status ${response.status}`);
 					}
-
-					// Add bot response to chat
-					addMessageToChat(data.response, "bot");
+					let botText = null;
+					let markdownSource = "";
+					let renderPending = false;
+
+					const showBotText = () => {
+						if (!botText) {
+							if (typingIndicator) {
+								typingIndicator.classList.remove("active");
+							}
+							botText = addMessageToChat("", "bot");
+						}
+						return botText;
+					};
+
+					return readEventStream(response, (event, data) => {
+						if (event === "token") {
+							// Render the markdown received so far, at most once per frame
+							markdownSource += data.text;
+							showBotText();
+							if (!renderPending) {
+								renderPending = true;
+								requestAnimationFrame(() => {
+									renderPending = false;
+									if (markdownSource === null) return; // already replaced by the final html
+									botText.innerHTML = renderMarkdown(markdownSource);
+									scrollChatToBottom();
+								});
+							}
+						} else if (event === "done" || event === "error") {
+							// The server's html is the final version of the answer
+							showBotText().innerHTML = data.response;
+							markdownSource = null;
+							scrollChatToBottom();
+						}
+					}).then(() => {
+						if (!botText) {
+							throw new Error("Chat stream ended without an answer");
+						}
+					});
 				})
 				.catch((error) => {
 					console.error("Error:", error);
@@ -88,6 +122,65 @@ document.addEventListener("DOMContentLoaded", function () {
 		}
 	};
 
+	// Read a Server-Sent Events response body, calling onEvent(event, data) for every event
+	function readEventStream(response, onEvent) {
+		const reader = response.body.getReader();
+		const decoder = new TextDecoder();
+		let buffer = "";
+
+		function dispatch(block) {
+			let event = "message";
+			const dataLines = [];
+			block.split("\n").forEach((line) => {
+				if (line.startsWith("event:")) {
+					event = line.slice(6).trim();
+				} else if (line.startsWith("data:")) {
+					dataLines.push(line.slice(5).trimStart());
+				}
+			});
+			if (dataLines.length) {
+				onEvent(event, JSON.parse(dataLines.join("\n")));
+			}
+		}
+
+		function pump() {
+			return reader.read().then(({ done, value }) => {
+				buffer += decoder.decode(value || new Uint8Array(), { stream: !done });
+				const blocks = buffer.split("\n\n");
+				buffer = blocks.pop();
+				blocks.forEach(dispatch);
+				if (done) {
+					if (buffer.trim()) {
+						dispatch(buffer);
+					}
+					return;
+				}
+				return pump();
+			});
+		}
+		return pump();
+	}
+
+	// Markdown to html while an answer streams in; plain text if marked did not load
+	function renderMarkdown(source) {
+		if (window.marked) {
+			return marked.parse(source);
+		}
+		const div = document.createElement("div");
+		div.textContent = source;
+		return div.innerHTML.replace(/\n/g, "<br>");
+	}
+
+	function scrollChatToBottom() {
+		const chatContainer = document.getElementById("chat-container");
+		if (chatContainer) {
+			chatContainer.scrollTo({
+				top: chatContainer.scrollHeight,
+				behavior: "smooth",
+			});
+		}
+	}
+
 	// Event Listeners for sending messages
 	sendBtn.addEventListener("click", sendMessage);
 
@@ -100,7 +193,7 @@ document.addEventListener("DOMContentLoaded", function () {
 	// Function to add messages to chat
 	function addMessageToChat(message, sender) {
 		const chatMessages = document.getElementById("chat-messages");
-		if (!chatMessages) return;
+		if (!chatMessages) return null;
 
 		const messageDiv = document.createElement("div");
 		messageDiv.className = `message ${sender}-message`;
@@ -121,13 +214,8 @@ document.addEventListener("DOMContentLoaded", function () {
 		messageDiv.appendChild(timeDiv);
 
 		chatMessages.appendChild(messageDiv);
-		requestAnimationFrame(() => {
-			chatContainer = document.getElementById("chat-container");
-			chatContainer.scrollTo({
-				top: chatContainer.scrollHeight,
-				behavior: "smooth",
-			});
-		});
+		requestAnimationFrame(scrollChatToBottom);
+		return textDiv;
 	}
 
 	// Quick Links functionality
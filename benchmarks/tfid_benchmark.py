@@ -0,0 +1,204 @@
+# benchmarks/tfid_benchmark.py
+"""
+Retrieval scaling benchmark for the TF-IDF / BM25 engine in app/chatbot/tfid.py.
+
+Generates synthetic corpora from the vocabulary of the bundled CSV and measures, per size:
+index build time, artifact (memory-mapped) load time, peak RSS, single-query latency
+percentiles and batch throughput. Results are written as JSON so runs can be compared
+across commits.
+
+    uv run python -m benchmarks.tfid_benchmark --sizes 1000 10000 100000 1000000
+"""
+from __future__ import annotations
+import argparse
+import csv
+import json
+import multiprocessing
+import random
+import re
+import resource
+import subprocess
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+SOURCE_CSV = ROOT / "app" / "chatbot" / "data" / "Structured_Chatbot_Data.csv"
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+CSV_HEADER = ["Intent Tag", "User Query (Pattern)", "Bot Response"]
+
+
+def log(msg: str) -> None:
+    print(f"[BENCH] {msg}", flush=True)
+
+
+def load_source() -> tuple[List[str], List[str], List[str]]:
+    """Vocabulary, intent tags and answers of the bundled CSV."""
+    with open(SOURCE_CSV, encoding="utf-8") as f:
+        rows = [row for row in csv.DictReader(f) if row["User Query (Pattern)"]]
+    vocabulary = sorted({word for row in rows for word in re.findall(r"\w+", row["User Query (Pattern)"])})
+    tags = sorted({row["Intent Tag"] for row in rows})
+    answers = sorted({row["Bot Response"] for row in rows})
+    return vocabulary, tags, answers
+
+
+def synthetic_pattern(rng: random.Random, vocabulary: List[str]) -> str:
+    return " ".join(rng.choices(vocabulary, k=rng.randint(3, 10))) + "?"
+
+
+def write_corpus(data_dir: Path, size: int, seed: int) -> None:
+    vocabulary, tags, answers = load_source()
+    rng = random.Random(seed)
+    with open(data_dir / "Structured_Chatbot_Data.csv", "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(CSV_HEADER)
+        for _ in range(size):
+            writer.writerow([rng.choice(tags), synthetic_pattern(rng, vocabulary), rng.choice(answers)])
+
+
+def make_queries(patterns: List[str], vocabulary: List[str], count: int, seed: int) -> List[str]:
+    """Half corpus patterns with a word dropped, half random word bags."""
+    rng = random.Random(seed)
+    queries = []
+    for i in range(count):
+        if i % 2:
+            words = rng.choice(patterns).split()
+            if len(words) > 1:
+                words.pop(rng.randrange(len(words)))
+            queries.append(" ".join(words))
+        else:
+            queries.append(" ".join(rng.choices(vocabulary, k=rng.randint(2, 6))))
+    return queries
+
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_size(data_dir: str, scorer: str, num_queries: int, batch_size: int, k: int, seed: int) -> Dict:
+    """Runs in a fresh process so peak RSS belongs to this size alone."""
+    from app.chatbot.tfid import TFIDModel
+
+    index_path = Path(data_dir) / "tfid_index.bin"
+    # Measure a cold build, not a load of the artifact left by the previous scorer
+    index_path.unlink(missing_ok=True)
+    index_path = str(index_path)
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    model = TFIDModel(index_path=index_path, data_dir=data_dir, scorer=scorer)
+    model.load_data()
+    build_seconds = time.perf_counter() - start
+    build_peak_rss = peak_rss_mb()
+
+    start = time.perf_counter()
+    warm_model = TFIDModel(index_path=index_path, data_dir=data_dir, scorer=scorer)
+    warm_model.load_data()
+    artifact_load_seconds = time.perf_counter() - start
+
+    vocabulary, _, _ = load_source()
+    queries = make_queries(model.corpus, vocabulary, num_queries, seed)
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        model.find_best_matches([query], k=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+
+    start = time.perf_counter()
+    model.find_best_matches(queries, k=k, batch_size=batch_size)
+    batch_seconds = time.perf_counter() - start
+
+    return {
+        "rows": len(model.corpus),
+        "terms": len(model.vocabulary),
+        "postings": int(len(model.postings_rows)),
+        "build_seconds": build_seconds,
+        "artifact_load_seconds": artifact_load_seconds,
+        "artifact_bytes": Path(index_path).stat().st_size,
+        "peak_rss_mb": peak_rss_mb(),
+        "build_rss_growth_mb": build_peak_rss - rss_before,
+        "single_query_ms": {
+            "p50": percentile(latencies, 50),
+            "p95": percentile(latencies, 95),
+            "p99": percentile(latencies, 99),
+            "mean": sum(latencies) / len(latencies),
+        },
+        "batch_queries_per_second": len(queries) / batch_seconds if batch_seconds else 0.0,
+    }
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True)
+        return out.stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(sizes: List[int], scorers: List[str], num_queries: int, batch_size: int, k: int, seed: int) -> Dict:
+    ctx = multiprocessing.get_context("spawn")
+    results = []
+    for size in sizes:
+        with tempfile.TemporaryDirectory(prefix="tfid-bench-") as data_dir:
+            log(f"Generating corpus of {size} patterns")
+            write_corpus(Path(data_dir), size, seed)
+            for scorer in scorers:
+                log(f"  {scorer}: building and querying")
+                with ctx.Pool(1) as pool:
+                    result = pool.apply(run_size, (data_dir, scorer, num_queries, batch_size, k, seed))
+                result.update({"size": size, "scorer": scorer})
+                results.append(result)
+                log(
+                    f"  {scorer}: build {result['build_seconds']:.2f}s, load {result['artifact_load_seconds']:.3f}s, "
+                    f"peak {result['peak_rss_mb']:.0f} MB, p50 {result['single_query_ms']['p50']:.3f} ms, "
+                    f"p99 {result['single_query_ms']['p99']:.3f} ms, {result['batch_queries_per_second']:.0f} q/s"
+                )
+    return {
+        "commit": git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "config": {"queries": num_queries, "batch_size": batch_size, "k": k, "seed": seed},
+        "results": results,
+    }
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="PTU TF-IDF retrieval scaling benchmark")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--scorers", nargs="+", default=["tfidf", "bm25"], choices=["tfidf", "bm25"])
+    parser.add_argument("--queries", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=None, help="JSON file, default benchmarks/results/<time>-<commit>.json")
+    args = parser.parse_args(argv)
+
+    report = run(args.sizes, args.scorers, args.queries, args.batch_size, args.k, args.seed)
+
+    output = args.output
+    if output is None:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        output = RESULTS_DIR / f"{stamp}-{report['commit'] or 'nocommit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+    log(f"Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
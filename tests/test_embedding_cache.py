@@ -0,0 +1,45 @@
+import numpy as np
+
+from app.chatbot.embedding_cache import EmbeddingCache
+
+
+class CountingEmbedder:
+    """Deterministic 4-dim embeddings; counts the texts it was asked to encode."""
+
+    def __init__(self):
+        self.encoded = 0
+
+    def encode(self, texts, convert_to_numpy=True, **_):
+        self.encoded += len(texts)
+        return np.asarray([[len(text), text.count("a"), text.count("e"), 1.0] for text in texts])
+
+
+def test_query_encodes_are_not_persisted(tmp_path):
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache("stub-embedder", root=tmp_path, max_query_entries=2)
+    cache.encode(["hostel fee", "exam dates"], lambda: embedder)
+    keys = (cache.dir / "keys.bin").read_bytes()
+
+    vectors = cache.encode(["hostel fee", "what is the hostel fee?"], lambda: embedder, persist=False)
+    assert vectors.tolist() == [[10, 0, 3, 1], [23, 1, 4, 1]]
+    assert embedder.encoded == 3
+    # nothing written, and a fresh process does not know the query
+    assert (cache.dir / "keys.bin").read_bytes() == keys
+    assert len(EmbeddingCache("stub-embedder", root=tmp_path)) == 2
+
+    # kept in memory for repeated queries, up to max_query_entries
+    cache.encode(["what is the hostel fee?"], lambda: embedder, persist=False)
+    assert embedder.encoded == 3
+    cache.encode(["a", "b"], lambda: embedder, persist=False)
+    cache.encode(["what is the hostel fee?"], lambda: embedder, persist=False)
+    assert embedder.encoded == 6
+
+
+def test_query_encode_without_a_cache_on_disk(tmp_path):
+    embedder = CountingEmbedder()
+    cache = EmbeddingCache("stub-embedder", root=tmp_path)
+    first = cache.encode(["fee"], lambda: embedder, persist=False)
+    again = cache.encode(["fee"], lambda: embedder, persist=False)
+    assert again.tolist() == first.tolist() == [[3, 0, 2, 1]]
+    assert embedder.encoded == 1
+    assert not cache.dir.exists()
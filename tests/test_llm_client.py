@@ -0,0 +1,224 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from app.chatbot import groq_model
+from app.chatbot.llm_client import CircuitBreaker, LLMClient, LLMUnavailable
+
+MODEL = "stub-model"
+MESSAGES = [{"role": "user", "content": "hello"}]
+
+
+class StubGroq(BaseHTTPRequestHandler):
+    """
+    OpenAI-style chat completions endpoint. The server's `script` lists what the next
+    requests get: "ok", "slow" (answers after 1 s) or an HTTP status code; once it is
+    used up every request gets "ok".
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        with self.server.lock:
+            self.server.requests += 1
+            action = self.server.script.pop(0) if self.server.script else "ok"
+        if action == "slow":
+            time.sleep(1)
+            action = "ok"
+        if action == "ok":
+            status, body = 200, {
+                "id": "stub",
+                "object": "chat.completion",
+                "created": 0,
+                "model": MODEL,
+                "choices": [
+                    {"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": "**stub answer**"}}
+                ],
+            }
+        else:
+            status, body = action, {"error": {"message": f"stub error {action}"}}
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        try:
+            self.wfile.write(payload)
+        except OSError:
+            # the client gave up on a slow answer
+            pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGroq)
+    server.lock = threading.Lock()
+    server.script = []
+    server.requests = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def make_client(server, **kwargs):
+    options = {"timeout": 2.0, "max_retries": 2, "backoff": 0.01, "breaker": CircuitBreaker(5, 30.0)}
+    options.update(kwargs)
+    return LLMClient(api_key="test", base_url=f"http://127.0.0.1:{server.server_port}", **options)
+
+
+def test_answer(server):
+    assert make_client(server).complete(MESSAGES, MODEL) == "**stub answer**"
+    assert server.requests == 1
+
+
+def test_deadline(server):
+    server.script = ["slow", "slow", "slow"]
+    client = make_client(server, timeout=0.3)
+
+    start = time.monotonic()
+    with pytest.raises(LLMUnavailable):
+        client.complete(MESSAGES, MODEL)
+    assert time.monotonic() - start < 0.8
+
+
+@pytest.mark.parametrize("status", [500, 503, 429])
+def test_retries_server_errors(server, status):
+    server.script = [status, status]
+    assert make_client(server).complete(MESSAGES, MODEL) == "**stub answer**"
+    assert server.requests == 3
+
+
+def test_retries_are_bounded(server):
+    server.script = [500] * 5
+    with pytest.raises(LLMUnavailable):
+        make_client(server, max_retries=1).complete(MESSAGES, MODEL)
+    assert server.requests == 2
+
+
+def test_client_errors_are_not_retried(server):
+    server.script = [400]
+    with pytest.raises(Exception) as error:
+        make_client(server).complete(MESSAGES, MODEL)
+    assert not isinstance(error.value, LLMUnavailable)
+    assert server.requests == 1
+
+
+def test_breaker_opens_and_closes_after_half_open_trial(server):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.2)
+    client = make_client(server, max_retries=0, breaker=breaker)
+
+    server.script = [500, 500]
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            client.complete(MESSAGES, MODEL)
+    assert breaker.state == "open"
+
+    # open: rejected without a request
+    with pytest.raises(LLMUnavailable, match="circuit breaker is open"):
+        client.complete(MESSAGES, MODEL)
+    assert server.requests == 2
+
+    time.sleep(0.25)
+    assert breaker.state == "half_open"
+    assert client.complete(MESSAGES, MODEL) == "**stub answer**"
+    assert breaker.state == "closed"
+
+
+def test_failed_half_open_trial_reopens(server):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.2)
+    client = make_client(server, max_retries=0, breaker=breaker)
+
+    server.script = [500, 500]
+    with pytest.raises(LLMUnavailable):
+        client.complete(MESSAGES, MODEL)
+    time.sleep(0.25)
+    with pytest.raises(LLMUnavailable):
+        client.complete(MESSAGES, MODEL)
+    assert breaker.state == "open"
+
+
+def test_degraded_answer(server, monkeypatch):
+    monkeypatch.setattr(groq_model, "client", make_client(server, max_retries=1))
+
+    server.script = [500, 500]
+    assert groq_model.answer_with_status("hostel fee?", "The hostel fee is *low*.") == (
+        "<p>The hostel fee is <em>low</em>.</p>",
+        True,
+    )
+    assert groq_model.answer_with_status("hostel fee?", "The hostel fee is *low*.") == (
+        "<p><strong>stub answer</strong></p>",
+        False,
+    )
+
+
+class FakeStream:
+    """Context-managed iterator of chat completion chunks, like groq's Stream."""
+
+    def __init__(self, contents):
+        self.contents = contents
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __iter__(self):
+        for content in self.contents:
+            delta = type("Delta", (), {"content": content})()
+            choice = type("Choice", (), {"delta": delta, "finish_reason": None})()
+            yield type("Chunk", (), {"choices": [choice]})()
+
+
+class FakeGroq:
+    def __init__(self, contents):
+        self.contents = contents
+        self.chat = self
+        self.completions = self
+
+    def with_options(self, **_):
+        return self
+
+    def create(self, **_):
+        return FakeStream(self.contents)
+
+
+def test_abandoned_stream_ends_half_open_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = LLMClient(api_key="test", breaker=breaker)
+    client._client = FakeGroq(["a", "b", "c"])
+    breaker.record_failure()
+    time.sleep(0.1)
+    assert breaker.state == "half_open"
+
+    # the consumer goes away mid-answer, as werkzeug does when the browser disconnects
+    stream = client.stream(MESSAGES, MODEL)
+    assert next(stream) == "a"
+    stream.close()
+
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+
+def test_deadline_does_not_hold_half_open_trial(server):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    client = make_client(server, breaker=breaker)
+    breaker.record_failure()
+    time.sleep(0.1)
+
+    # no time left: the attempt is never made, so the trial stays available
+    with pytest.raises(LLMUnavailable, match="deadline exceeded"):
+        client._check_attempt(time.monotonic() - 1)
+    assert breaker.state == "half_open"
+
+    assert client.complete(MESSAGES, MODEL) == "**stub answer**"
+    assert breaker.state == "closed"
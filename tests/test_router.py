@@ -0,0 +1,57 @@
+import pytest
+
+from app.chatbot.router import ConfidenceRouter
+from app.chatbot.tfid import TFIDModel
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    model = TFIDModel(index_path=str(tmp_path_factory.mktemp("tfid") / "tfid_index.bin"))
+    model.load_data()
+    return model
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        "hi, what is the hostel fee for girls?",
+        "thanks, and what is the placement percentage for CSE?",
+        "What is the fee structure for B.Tech CSE lateral entry at PTU for NRI students?",
+    ],
+)
+def test_short_pattern_inside_a_question_goes_to_llm(model, message):
+    assert ConfidenceRouter(intent_threshold=1.0, tfidf_threshold=0.9).route(model.local_matches(message)) is None
+
+
+@pytest.mark.parametrize("message", ["hello", "thank you", "What courses are offered by PTU?"])
+def test_exact_match_is_answered_locally(model, message):
+    router = ConfidenceRouter(intent_threshold=1.0, tfidf_threshold=0.9)
+    assert router.route(model.local_matches(message)) is not None
+    assert router.stats["local"] == 1
+
+
+# A corpus question and the same question about another programme
+PROGRAMME_SWAPS = [
+    ("What is the eligibility for BBA at PTU?", "What is the eligibility for MCA at PTU?"),
+    ("What is the fee for BBA at PTU?", "What is the fee for MBA?"),
+    ("What is the fee for BBA at PTU?", "fee for BCA?"),
+]
+
+
+@pytest.mark.parametrize("question, swapped", PROGRAMME_SWAPS)
+def test_other_programme_goes_to_llm(model, question, swapped):
+    router = ConfidenceRouter(intent_threshold=1.0, tfidf_threshold=0.9)
+    assert router.route(model.local_matches(question)) is not None
+    assert router.route(model.local_matches(swapped)) is None
+
+
+def test_llm_outcome_can_be_recorded_by_the_caller(model):
+    router = ConfidenceRouter(intent_threshold=1.0, tfidf_threshold=0.9)
+    matches = model.local_matches("What is the fee for MBA?")
+    assert router.route(matches, record_llm=False) is None
+    assert router.metrics()["messages"] == 0
+
+    # e.g. answered from the semantic cache after all
+    router.record("semantic_cache", router.scores(matches))
+    assert router.metrics()["semantic_cache"] == 1
+    assert router.metrics()["llm_share"] == 0.0
@@ -0,0 +1,36 @@
+import pytest
+
+from app.chatbot.cache import SemanticCache
+from app.chatbot.tfid import TFIDModel
+
+# Questions that differ only in words the corpus does not know (or does not weight)
+DIFFERENT_QUESTIONS = [
+    ("who is the registrar of ptu", "who is the vice chancellor of ptu"),
+    ("is there a cricket ground in ptu", "is there a swimming pool in ptu"),
+    ("btech 5th semester exam", "mba 1st semester exam"),
+]
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    model = TFIDModel(index_path=str(tmp_path_factory.mktemp("tfid") / "tfid_index.bin"))
+    model.load_data()
+    return model
+
+
+@pytest.mark.parametrize("first, second", DIFFERENT_QUESTIONS)
+def test_unknown_words_keep_questions_apart(model, first, second):
+    cache = SemanticCache(model.embed_query, threshold=0.9)
+    cache.set(cache.embed(first), "first answer", intent="first")
+    cache.set(cache.embed(second), "second answer", intent="second")
+
+    assert cache.get(cache.embed(second)) == "second answer"
+    assert cache.get(cache.embed(first)) == "first answer"
+    assert cache.stats()["size"] == 2
+
+
+def test_paraphrase_reuses_answer(model):
+    cache = SemanticCache(model.embed_query, threshold=0.9)
+    cache.set(cache.embed("what is the hostel fee"), "hostel answer", intent="hostel")
+
+    assert cache.get(cache.embed("what is the hostel fee at ptu")) == "hostel answer"
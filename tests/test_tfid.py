@@ -0,0 +1,61 @@
+import os
+
+import pytest
+
+from app.chatbot.tfid import TFIDModel, TrigramIndex
+
+
+def load_model(index_path):
+    model = TFIDModel(index_path=str(index_path))
+    model.load_data()
+    return model
+
+
+@pytest.fixture(scope="module")
+def model(tmp_path_factory):
+    return load_model(tmp_path_factory.mktemp("tfid") / "tfid_index.bin")
+
+
+@pytest.mark.parametrize("keep", [0.5, 0.0, 0.001])
+def test_damaged_artifact_is_rebuilt(tmp_path, keep):
+    index_path = tmp_path / "tfid_index.bin"
+    built = load_model(index_path)
+    size = os.path.getsize(index_path)
+    with open(index_path, "r+b") as f:
+        f.truncate(int(size * keep))
+
+    model = load_model(index_path)
+    assert len(model.corpus) == len(built.corpus)
+    assert model.intents
+    assert model.loaded_source_hash == built.loaded_source_hash
+    assert model.find_best_match("What courses are offered by PTU?") != -1
+    # rewritten in full, so the next process maps it again
+    assert os.path.getsize(index_path) == size
+    assert load_model(index_path)._load_index(built.loaded_source_hash)
+
+
+@pytest.mark.parametrize(
+    "message, programme, other",
+    [
+        ("eligibility for m.tech", "M.Tech", "B.Tech"),
+        ("eligibility for M.Tech?", "M.Tech", "B.Tech"),
+        ("eligibility for b.tech", "B.Tech", "M.Tech"),
+        ("fee for M.Tech", "M.Tech", "B.Tech"),
+        ("fee for B.Tech at PTU", "B.Tech", "M.Tech"),
+    ],
+)
+def test_dotted_abbreviation_matches_its_programme(model, message, programme, other):
+    pattern = model.corpus[model.find_best_match(message)]
+    assert programme in pattern and other not in pattern
+
+
+def test_m_tech_question_does_not_match_b_tech(model):
+    match = model.find_best_match("jee m.tech?")
+    assert match == -1 or "B.Tech" not in model.corpus[match]
+
+
+def test_correction_keeps_the_first_letter():
+    index = TrigramIndex({"tech": 10, "hostel": 5})
+    assert index.correct("mtech") is None
+    assert index.correct("tehc") == "tech"
+    assert index.correct("hostl") == "hostel"
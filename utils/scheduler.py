@@ -5,6 +5,7 @@ from apscheduler.triggers.interval import IntervalTrigger
 import atexit
 from zoneinfo import ZoneInfo
 
+from app.chatbot.utils import reload_knowledge_base
 from app.ptu_utils import fetch_ptu_notices
 
 
@@ -20,6 +21,15 @@ def start_scheduler():
         replace_existing=True,
     )
 
+    # Add job to pick up changes to the chatbot data files every minute
+    scheduler.add_job(
+        func=reload_knowledge_base,
+        trigger=IntervalTrigger(minutes=1),
+        id="reload_knowledge_base_job",
+        name="Reload chatbot knowledge base",
+        replace_existing=True,
+    )
+
     # Start the scheduler
     scheduler.start()
 